@@ -1,16 +1,17 @@
-import numpy as np
-import pandas as pd
-from sklearn.ensemble import IsolationForest, RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-import joblib
 import json
 
 
 class AIModule:
-    """AI/ML Module for blockchain analytics and security"""
+    """AI/ML Module for blockchain analytics and security
+    
+    scikit-learn is imported when the first module is created, and numpy by
+    the methods that use it, not when this file is imported.
+    """
     
     def __init__(self):
+        from sklearn.ensemble import IsolationForest, RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+        
         self.anomaly_detector = IsolationForest(contamination=0.1, random_state=42)
         self.transaction_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
@@ -18,6 +19,8 @@ class AIModule:
     
     def extract_features(self, block_data):
         """Extract features from blockchain data"""
+        import numpy as np
+        
         features = []
         
         if isinstance(block_data, list):
@@ -44,6 +47,8 @@ class AIModule:
     
     def train_anomaly_detector(self, blockchain_data):
         """Train anomaly detection model"""
+        import numpy as np
+        
         try:
             features = self.extract_features(blockchain_data)
             
@@ -85,6 +90,8 @@ class AIModule:
     
     def _generate_synthetic_data(self, n_samples):
         """Generate synthetic blockchain data for training"""
+        import numpy as np
+        
         np.random.seed(42)
         synthetic = []
         
@@ -140,6 +147,8 @@ class AIModule:
     
     def analyze_blockchain_patterns(self, blockchain_data):
         """Analyze patterns in blockchain"""
+        import numpy as np
+        
         try:
             if not blockchain_data or len(blockchain_data) < 2:
                 return {"message": "Insufficient data for analysis"}
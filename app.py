@@ -1,10 +1,19 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
-from blockchain import Blockchain, SecurityModule
+from blockchain import Blockchain, SecurityModule, MempoolFull
 from ai_module import AIModule
+from mining_jobs import MiningJobManager, MiningQueueFull
+from events import EventBus, format_sse
+from storage import (CompactChainStore, SegmentLogStore, SQLiteChainStore, WriteAheadJournal,
+                     load_snapshot, save_snapshot)
+import atexit
+import functools
+import hashlib
 import json
 import os
 import logging
+import threading
+import zlib
 
 app = Flask(__name__, static_folder='static')
 CORS(app)
@@ -14,12 +23,181 @@ log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
 # Initialize blockchain and AI module
-blockchain = Blockchain(difficulty=4)
-ai_module = AIModule()
-security = SecurityModule()
+CHAIN_STORES = {
+    'memory': lambda: None,
+    'compact': CompactChainStore,
+    'segment': lambda: SegmentLogStore(os.environ.get('DATA_DIR', 'data')),
+    'sqlite': lambda: SQLiteChainStore(os.environ.get('CHAIN_DB', 'chain.db')),
+    # Extra API processes serving a chain that another process mines into
+    'sqlite-readonly': lambda: SQLiteChainStore(os.environ.get('CHAIN_DB', 'chain.db'), read_only=True)
+}
+
+# Keys come from the keystore, else the snapshot, so old signatures stay verifiable
+KEYSTORE_PASSWORD = os.environ.get('KEYSTORE_PASSWORD')
+SIGNER = os.environ.get('SIGNER', 'cryptography')
+SNAPSHOT_FILE = os.environ.get('SNAPSHOT_FILE')
+snapshot = load_snapshot(SNAPSHOT_FILE, KEYSTORE_PASSWORD, SIGNER) if SNAPSHOT_FILE else None
+if os.environ.get('KEYSTORE_FILE'):
+    chain_security = SecurityModule.from_keystore(os.environ['KEYSTORE_FILE'], KEYSTORE_PASSWORD, SIGNER)
+elif snapshot is not None:
+    chain_security = snapshot['security']
+else:
+    chain_security = SecurityModule(signer=SIGNER)
+
+blockchain = Blockchain(
+    difficulty=4,
+    mining_workers=int(os.environ.get('MINING_WORKERS', 1)),
+    header_format=os.environ.get('HEADER_FORMAT', 'json'),
+    retarget_interval=int(os.environ['RETARGET_INTERVAL']) if os.environ.get('RETARGET_INTERVAL') else None,
+    target_block_time=float(os.environ.get('TARGET_BLOCK_TIME', 10.0)),
+    max_block_transactions=int(os.environ.get('MAX_BLOCK_TRANSACTIONS', 500)),
+    max_pending_age=float(os.environ.get('MAX_PENDING_AGE', 30.0)),
+    store=CHAIN_STORES[os.environ.get('CHAIN_STORE', 'memory')](),
+    journal=WriteAheadJournal(os.environ['JOURNAL_FILE']) if os.environ.get('JOURNAL_FILE') else None,
+    security=chain_security,
+    snapshot=snapshot['chain'] if snapshot is not None else None
+)
+
+# Trusted checkpoints ([{"height": ..., "hash": ..., "signature": ...}, ...])
+if os.environ.get('CHECKPOINTS_FILE'):
+    with open(os.environ['CHECKPOINTS_FILE']) as f:
+        for checkpoint in json.load(f):
+            blockchain.add_checkpoint(checkpoint['height'], checkpoint['hash'],
+                                      checkpoint.get('signature'))
+atexit.register(blockchain.close)
+
+# In-memory chains only persist through the snapshot; until one is written,
+# journaled blocks stay open in the journal and get re-mined after a crash
+if os.environ.get('JOURNAL_FILE') and not SNAPSHOT_FILE and \
+        os.environ.get('CHAIN_STORE', 'memory') in ('memory', 'compact'):
+    print("Warning: JOURNAL_FILE without SNAPSHOT_FILE on an in-memory chain store; "
+          "the journal is only trimmed once a snapshot holds the mined blocks")
+
+# In-process pub/sub feeding /api/events; each subscriber gets a bounded queue
+events = EventBus(max_queue=int(os.environ.get('EVENT_QUEUE_SIZE', 100)))
+blockchain.on_validation_failed = lambda height, source: events.publish(
+    'validation-failed', {'height': height, 'source': source})
+
+# Re-mine blocks accepted before a crash; whatever the time budget leaves is queued below
+recovery = blockchain.recover_journal(float(os.environ.get('JOURNAL_RECOVERY_SECONDS', 30.0)))
+if recovery['pending']:
+    print(f"Journal recovery: {recovery['replayed']} re-mined, "
+          f"{recovery['already_in_chain']} already on chain, {recovery['deferred']} deferred "
+          f"in {recovery['seconds']:.2f}s")
+
+# The demo /api/security endpoints get their own keys, never the chain's. They are
+# created on first use and kept in DEMO_KEYSTORE_FILE, if set, across restarts
+_demo_security = None
+_demo_security_lock = threading.Lock()
+
+
+def demo_security():
+    """The demo endpoints' SecurityModule, loaded or generated on first use"""
+    global _demo_security
+    with _demo_security_lock:
+        if _demo_security is None:
+            if os.environ.get('DEMO_KEYSTORE_FILE'):
+                _demo_security = SecurityModule.from_keystore(os.environ['DEMO_KEYSTORE_FILE'],
+                                                              KEYSTORE_PASSWORD, SIGNER)
+            else:
+                _demo_security = SecurityModule(signer=SIGNER)
+        return _demo_security
+
+
+# Reuse the trained model from the snapshot, else train on the initial blockchain data
+if snapshot is not None and snapshot['model'] is not None and snapshot['model'].is_trained:
+    ai_module = snapshot['model']
+else:
+    ai_module = AIModule()
+    ai_module.train_anomaly_detector(blockchain.get_chain())
+
+if SNAPSHOT_FILE:
+    atexit.register(lambda: save_snapshot(
+        SNAPSHOT_FILE, blockchain, ai_module,
+        include_blocks=os.environ.get('CHAIN_STORE', 'memory') in ('memory', 'compact'),
+        password=KEYSTORE_PASSWORD
+    ))
+
+
+def on_block_mined(new_block):
+    """Retrain the AI model, check a freshly mined block for anomalies and publish both"""
+    ai_module.train_anomaly_detector(blockchain.get_chain())
+    anomaly_check = ai_module.detect_anomaly(new_block.to_dict())
+    
+    block_summary = {
+        'index': new_block.index,
+        'hash': new_block.hash,
+        'timestamp': new_block.timestamp,
+        'nonce': new_block.nonce,
+        'transactions': len(new_block.transactions)
+    }
+    events.publish('block-mined', block_summary)
+    if anomaly_check.get('is_anomaly'):
+        events.publish('anomaly-detected', dict(block_summary, anomaly_check=anomaly_check))
+    return {'anomaly_check': anomaly_check}
+
+
+def on_job_progress(job):
+    """Publish a mining job's status and progress"""
+    events.publish('job-progress', {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'nonces_tried': job.nonces_tried,
+        'hashrate': job.hashrate,
+        'elapsed': job.elapsed()
+    })
 
-# Train AI module with initial blockchain data
-ai_module.train_anomaly_detector(blockchain.get_chain())
+
+# Mining runs on a bounded background pool so requests never wait on PoW
+mining_jobs = MiningJobManager(
+    blockchain,
+    max_workers=int(os.environ.get('MINING_JOB_WORKERS', 1)),
+    max_pending=int(os.environ.get('MINING_MAX_PENDING', 100)),
+    on_complete=on_block_mined,
+    on_progress=on_job_progress
+)
+mining_jobs.start_batch_scheduler()
+
+# Cancel jobs before the interpreter joins the pool threads, which happens
+# ahead of atexit handlers; cancelled blocks stay journaled for replay
+threading._register_atexit(mining_jobs.shutdown)
+if blockchain.journal is not None:
+    for entry_id, record in blockchain.journal.pending():
+        try:
+            mining_jobs.submit_accepted(entry_id, record)
+        except MiningQueueFull:
+            break
+
+
+def chain_etag(view):
+    """Serve a GET view with an ETag derived from the chain tip, answering 304 when unchanged
+    
+    Besides the tip hash the tag covers the request path and query, the
+    validation watermark (so tampering changes it) and the mempool and
+    journal sizes shown in stats.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        state = [
+            blockchain.get_latest_block().hash,
+            len(blockchain.chain),
+            blockchain.get_chain_summary()['validated_height'],
+            len(blockchain.pending_transactions),
+            len(blockchain.journal) if blockchain.journal is not None else 0,
+            request.full_path
+        ]
+        etag = hashlib.sha256(json.dumps(state).encode()).hexdigest()[:32]
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
 
 
 @app.route('/')
@@ -29,48 +207,277 @@ def index():
 
 
 @app.route('/api/blockchain', methods=['GET'])
+@chain_etag
 def get_blockchain():
-    """Get the entire blockchain"""
-    chain = blockchain.get_chain()
-    stats = blockchain.get_chain_stats()
+    """Get one page of the blockchain (?limit=, ?cursor= or ?from_height=, ?order=asc|desc)"""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    order = request.args.get('order', 'asc')
+    cursor = request.args.get('cursor', request.args.get('from_height'), type=int)
     
-    return jsonify({
-        'chain': chain,
-        'stats': stats
-    })
+    if limit < 1 or (cursor is not None and cursor < 0):
+        return jsonify({'error': 'limit must be positive and cursor non-negative'}), 400
+    if order not in ('asc', 'desc'):
+        return jsonify({'error': "order must be 'asc' or 'desc'"}), 400
+    
+    blocks, next_cursor = blockchain.get_chain_page(limit, cursor, order)
+    page = {
+        'order': order,
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'stats': blockchain.get_chain_summary()
+    }
+    
+    # Blocks are sealed, so their JSON is spliced in rather than re-encoded
+    body = '{"chain": [' + ', '.join(block.to_json() for block in blocks) + '], ' + json.dumps(page)[1:]
+    return Response(body, mimetype='application/json')
+
+
+@app.route('/api/blockchain/stats', methods=['GET'])
+@chain_etag
+def get_blockchain_stats():
+    """Full chain statistics, including incremental validation"""
+    return jsonify(blockchain.get_chain_stats())
+
+
+@app.route('/api/blockchain/export', methods=['GET'])
+def export_blockchain():
+    """Stream the chain as NDJSON, one block per line (?from=, ?to= inclusive, ?gzip=true)"""
+    start = request.args.get('from', 0, type=int)
+    end = request.args.get('to', type=int)
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    
+    if start < 0 or (end is not None and end < start):
+        return jsonify({'error': 'from must be non-negative and to at least from'}), 400
+    
+    def lines():
+        for block in blockchain.iter_blocks(start, None if end is None else end + 1):
+            yield block.to_json(cache=False) + '\n'
+    
+    def gzipped(chunks):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode())
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    headers = {'Content-Disposition': 'attachment; filename=blockchain.ndjson'}
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+        body = gzipped(lines())
+    else:
+        body = lines()
+    return Response(stream_with_context(body), mimetype='application/x-ndjson', headers=headers)
+
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-sent events stream (?topics=block-mined,validation-failed,anomaly-detected,job-progress)"""
+    topics = [topic for topic in request.args.get('topics', '').split(',') if topic] or None
+    subscription = events.subscribe(topics)
+    
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                event = subscription.get(timeout=15)
+                yield format_sse(event) if event is not None else ': keepalive\n\n'
+        finally:
+            subscription.close()
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route('/api/block/add', methods=['POST'])
 def add_block():
-    """Add a new block to the blockchain"""
+    """Queue a new block for mining and return its job id"""
     try:
         data = request.json
         
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
-        # Add block to blockchain
-        new_block = blockchain.add_block(data)
+        job = mining_jobs.submit(data)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/api/mining/jobs/{job.id}'
+        }), 202
+    except MiningQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/mining/jobs', methods=['GET'])
+def list_mining_jobs():
+    """List recent mining jobs"""
+    return jsonify({'jobs': [job.to_dict() for job in mining_jobs.list_jobs()]})
+
+
+@app.route('/api/mining/jobs/<job_id>', methods=['GET'])
+def get_mining_job(job_id):
+    """Get progress and result of a mining job"""
+    job = mining_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/mining/jobs/<job_id>', methods=['DELETE'])
+@app.route('/api/mining/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_mining_job(job_id):
+    """Cancel a queued or running mining job"""
+    job = mining_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/transactions', methods=['POST'])
+def submit_transaction():
+    """Add a transaction to the mempool for the next batched block"""
+    try:
+        payload = request.json or {}
+        data = payload.get('data')
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        priority = payload.get('priority', 0)
+        if isinstance(priority, str) and priority.strip().lstrip('+-').isdigit():
+            priority = int(priority)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            return jsonify({'error': 'priority must be an integer'}), 400
         
-        # Retrain AI model with updated blockchain
-        ai_module.train_anomaly_detector(blockchain.get_chain())
+        tx_hash, added = blockchain.submit_transaction(data, priority)
         
-        # Check for anomalies
-        anomaly_result = ai_module.detect_anomaly(new_block.to_dict())
+        # Mine right away once a full block's worth of transactions is waiting
+        job = mining_jobs.submit_batch() if blockchain.should_mine_pending() else None
         
         return jsonify({
             'success': True,
-            'block': new_block.to_dict(),
-            'anomaly_check': anomaly_result
-        })
+            'tx_hash': tx_hash,
+            'duplicate': not added,
+            'pending': len(blockchain.pending_transactions),
+            'job_id': job.id if job else None
+        }), 202
+    except (MempoolFull, MiningQueueFull) as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/mempool', methods=['GET'])
+def get_mempool():
+    """List pending transactions in priority order"""
+    entries, oldest_age = blockchain.get_pending()
+    
+    return jsonify({
+        'pending': len(entries),
+        'oldest_age': oldest_age,
+        'transactions': [
+            {
+                'tx_hash': entry['tx_hash'],
+                'priority': entry['priority'],
+                'received_at': entry['received_at']
+            }
+            for entry in entries
+        ]
+    })
+
+
+@app.route('/api/mempool/mine', methods=['POST'])
+def mine_mempool():
+    """Queue a batched block of pending transactions now"""
+    try:
+        payload = request.get_json(silent=True) or {}
+        job = mining_jobs.submit_batch(payload.get('miner_address', 'system'))
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': f'/api/mining/jobs/{job.id}'
+        }), 202
+    except MiningQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+
+
+@app.route('/api/block/<hash_or_height>', methods=['GET'])
+@chain_etag
+def get_block(hash_or_height):
+    """Look up a block by height or hash"""
+    block = blockchain.get_block(hash_or_height)
+    if block is None:
+        return jsonify({'error': 'Block not found'}), 404
+    
+    return Response(block.to_json(), mimetype='application/json')
+
+
+@app.route('/api/blocks/since/<int:height>', methods=['GET'])
+@chain_etag
+def get_blocks_since(height):
+    """Blocks above a height the client already has, oldest first (?limit=)"""
+    limit = min(request.args.get('limit', 500, type=int), 500)
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    
+    blocks = blockchain.get_blocks(height + 1, height + 1 + limit)
+    latest_block = blockchain.get_latest_block()
+    sync = {
+        'since': height,
+        'count': len(blocks),
+        'has_more': bool(blocks) and blocks[-1].index < latest_block.index,
+        'tip_height': latest_block.index,
+        'tip_hash': latest_block.hash
+    }
+    
+    body = '{"blocks": [' + ', '.join(block.to_json() for block in blocks) + '], ' + json.dumps(sync)[1:]
+    return Response(body, mimetype='application/json')
+
+
+@app.route('/api/blocks/search', methods=['GET'])
+def search_blocks():
+    """Find blocks whose hash starts with a prefix"""
+    prefix = request.args.get('prefix', '')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    
+    if not prefix:
+        return jsonify({'error': 'No prefix provided'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    
+    blocks = blockchain.search_blocks(prefix, limit)
+    return jsonify({
+        'prefix': prefix,
+        'count': len(blocks),
+        'blocks': [block.to_dict() for block in blocks]
+    })
+
+
+@app.route('/api/block/<int:index>/proof/<tx_hash>', methods=['GET'])
+def get_transaction_proof(index, tx_hash):
+    """Get a Merkle inclusion proof for one record in a block"""
+    try:
+        proof = blockchain.get_transaction_proof(index, tx_hash)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if proof is None:
+        return jsonify({'error': 'Transaction not found in block'}), 404
+    
+    return jsonify(proof)
+
+
 @app.route('/api/validate', methods=['GET'])
 def validate_chain():
-    """Validate the blockchain"""
-    is_valid = blockchain.is_chain_valid()
+    """Validate the blockchain (?full=true re-checks every block)"""
+    full = request.args.get('full', 'false').lower() == 'true'
+    is_valid = blockchain.is_chain_valid(full=full)
     health_score = ai_module.get_blockchain_health_score(
         blockchain.get_chain(),
         is_valid
@@ -82,13 +489,35 @@ def validate_chain():
     })
 
 
+@app.route('/api/audit', methods=['GET'])
+def audit_chain():
+    """Full segmented chain audit across a process pool (?signatures=true also verifies signatures)"""
+    workers = request.args.get('workers', type=int)
+    segment_size = request.args.get('segment_size', type=int)
+    signatures = request.args.get('signatures', 'false').lower() == 'true'
+    processes = request.args.get('signature_executor', 'thread') == 'process'
+    
+    return jsonify(blockchain.audit_chain(workers=workers, segment_size=segment_size,
+                                          verify_signatures=signatures,
+                                          signature_processes=processes))
+
+
+@app.route('/api/checkpoint/<int:height>', methods=['GET'])
+def get_checkpoint(height):
+    """Signed checkpoint for the block at a height"""
+    if not 0 <= height < len(blockchain.chain):
+        return jsonify({'error': 'Block not found'}), 404
+    
+    return jsonify(blockchain.sign_checkpoint(height))
+
+
 @app.route('/api/security/hash', methods=['POST'])
 def hash_data():
     """Hash data using specified algorithm"""
     data = request.json.get('data', '')
     algorithm = request.json.get('algorithm', 'sha256')
     
-    hashed = security.hash_data(data, algorithm)
+    hashed = demo_security().hash_data(data, algorithm)
     
     return jsonify({
         'original': data,
@@ -102,7 +531,7 @@ def encrypt_rsa():
     """Encrypt data using RSA"""
     data = request.json.get('data', '')
     
-    encrypted = security.rsa_encrypt(data)
+    encrypted = demo_security().rsa_encrypt(data)
     
     return jsonify({
         'original': data,
@@ -116,7 +545,7 @@ def decrypt_rsa():
     """Decrypt data using RSA"""
     encrypted_data = request.json.get('encrypted', '')
     
-    decrypted = security.rsa_decrypt(encrypted_data)
+    decrypted = demo_security().rsa_decrypt(encrypted_data)
     
     return jsonify({
         'encrypted': encrypted_data,
@@ -130,7 +559,7 @@ def encrypt_aes():
     """Encrypt data using AES"""
     data = request.json.get('data', '')
     
-    result = security.aes_encrypt(data)
+    result = demo_security().aes_encrypt(data)
     
     return jsonify({
         'original': data,
@@ -148,7 +577,7 @@ def decrypt_aes():
     key = request.json.get('key', '')
     iv = request.json.get('iv', '')
     
-    decrypted = security.aes_decrypt(ciphertext, key, iv)
+    decrypted = demo_security().aes_decrypt(ciphertext, key, iv)
     
     return jsonify({
         'encrypted': ciphertext,
@@ -162,7 +591,7 @@ def sign_data():
     """Sign data using ECDSA"""
     data = request.json.get('data', '')
     
-    signature = security.sign_data(data)
+    signature = demo_security().sign_data(data)
     
     return jsonify({
         'data': data,
@@ -177,7 +606,7 @@ def verify_signature():
     data = request.json.get('data', '')
     signature = request.json.get('signature', '')
     
-    is_valid = security.verify_signature(data, signature)
+    is_valid = demo_security().verify_signature(data, signature)
     
     return jsonify({
         'data': data,
@@ -208,6 +637,7 @@ def predict_risk():
 
 
 @app.route('/api/ai/analyze', methods=['GET'])
+@chain_etag
 def analyze_blockchain():
     """Analyze blockchain patterns"""
     chain = blockchain.get_chain()
@@ -226,6 +656,7 @@ def train_ai():
 
 
 @app.route('/api/stats', methods=['GET'])
+@chain_etag
 def get_stats():
     """Get comprehensive system statistics"""
     chain = blockchain.get_chain()
@@ -355,10 +355,9 @@ elif page == "⛓️ Blockchain":
             if st.button("🔄 Refresh", use_container_width=True):
                 st.rerun()
         
-        for block in chain[::-1]:
-            if search and search.lower() not in str(block['hash']).lower() and search not in str(block['index']):
-                continue
-            
+        display_chain = blockchain.explore(search) if search else chain[::-1]
+        
+        for block in display_chain:
             with st.expander(f"🔗 Block #{block['index']} - {block['hash'][:20]}...", expanded=(block['index'] == len(chain)-1)):
                 col1, col2 = st.columns(2)
                 with col1:
@@ -0,0 +1,265 @@
+"""Performance benchmarks for the blockchain core"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from storage import CompactChainStore
+from blockchain import (Block, Blockchain, HeaderTemplate, HEADER_BINARY, SIGNERS, SecurityModule,
+                        default_mining_workers)
+
+
+def bench_imports(rounds):
+    """Time module imports and whole worker-process startup in fresh interpreters"""
+    snippets = (
+        ('import blockchain', 'import blockchain'),
+        ('import storage', 'import storage'),
+        ('import ai_module', 'import ai_module'),
+        ('SecurityModule()', 'import blockchain; blockchain.SecurityModule()'),
+        ('AIModule()', 'import ai_module; ai_module.AIModule()')
+    )
+    timer = 'import time; start = time.perf_counter(); {}; print(time.perf_counter() - start)'
+    here = os.path.dirname(os.path.abspath(__file__))
+    
+    print(f"{'':<18} {'import (ms)':>12} {'process (ms)':>13}")
+    for label, code in snippets:
+        imported = process = 0.0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, '-c', timer.format(code)], cwd=here,
+                                    capture_output=True, text=True, check=True).stdout
+            process += time.perf_counter() - start
+            imported += float(output)
+        print(f"{label:<18} {imported / rounds * 1000:>12.1f} {process / rounds * 1000:>13.1f}")
+
+
+def bench_encryption(rounds):
+    """Compare direct RSA-OAEP with envelope encryption across payload sizes"""
+    security = SecurityModule()
+    print(f"{'payload':>10} {'rsa (ms)':>10} {'envelope (ms)':>14}")
+    for size in (100, 10000, 1000000):
+        message = 'x' * size
+        start = time.perf_counter()
+        for _ in range(rounds):
+            rsa_result = security.rsa_encrypt(message)
+        rsa_time = (time.perf_counter() - start) / rounds * 1000
+        start = time.perf_counter()
+        for _ in range(rounds):
+            security.envelope_encrypt(message)
+        envelope_time = (time.perf_counter() - start) / rounds * 1000
+        rsa_label = 'fails' if rsa_result.startswith('Encryption error') else f"{rsa_time:.2f}"
+        print(f"{size:>10,} {rsa_label:>10} {envelope_time:>14.2f}")
+
+
+def bench_signing(operations):
+    """Signs and verifications per second of each ECDSA backend, plus cross-verification"""
+    message = json.dumps({'encrypted_data': 'A' * 344, 'hash': 'c' * 64}).encode()
+    pem = SIGNERS['cryptography']().to_pem()
+    signers = {name: signer(pem) for name, signer in SIGNERS.items()}
+    
+    print(f"{'backend':<14} {'sign/s':>10} {'verify/s':>10}")
+    for name, signer in signers.items():
+        start = time.perf_counter()
+        for _ in range(operations):
+            signature = signer.sign(message)
+        signs = operations / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(operations):
+            signer.verify(message, signature)
+        verifies = operations / (time.perf_counter() - start)
+        print(f"{name:<14} {signs:>10,.0f} {verifies:>10,.0f}")
+    
+    crypto, pure = signers['cryptography'], signers['ecdsa']
+    print(f"cross-verify: cryptography->ecdsa {pure.verify(message, crypto.sign(message))}, "
+          f"ecdsa->cryptography {crypto.verify(message, pure.sign(message))}")
+
+
+def bench_mining(difficulties, workers, rounds):
+    """Compare serial and parallel proof-of-work search"""
+    print(f"{'difficulty':>10} {'workers':>8} {'avg time (s)':>13} {'avg nonce':>12}")
+    for difficulty in difficulties:
+        for worker_count in sorted({1, workers}):
+            elapsed = 0.0
+            nonces = 0
+            for i in range(rounds):
+                block = Block(i + 1, time.time(), {'benchmark': i}, '0' * 64)
+                start = time.perf_counter()
+                block.mine_block(difficulty, worker_count)
+                elapsed += time.perf_counter() - start
+                nonces += block.nonce
+            print(f"{difficulty:>10} {worker_count:>8} {elapsed / rounds:>13.3f} {nonces // rounds:>12,}")
+
+
+def bench_hashing(attempts):
+    """Compare per-nonce calculate_hash against the header-template engine"""
+    payload = {'encrypted_data': 'A' * 344, 'signature': 'B' * 88, 'hash': 'c' * 64}
+    block = Block(1, time.time(), payload, '0' * 64)
+    
+    start = time.perf_counter()
+    for nonce in range(attempts):
+        block.nonce = nonce
+        block.calculate_hash()
+    baseline = attempts / (time.perf_counter() - start)
+    
+    template = HeaderTemplate.from_block(block)
+    start = time.perf_counter()
+    for nonce in range(attempts):
+        template.digest(nonce)
+    engine = attempts / (time.perf_counter() - start)
+    
+    binary_block = Block(1, block.timestamp, payload, '0' * 64, version=HEADER_BINARY)
+    template = HeaderTemplate.from_block(binary_block)
+    start = time.perf_counter()
+    for nonce in range(attempts):
+        template.digest(nonce)
+    binary = attempts / (time.perf_counter() - start)
+    
+    print(f"calculate_hash:  {baseline:>12,.0f} H/s")
+    print(f"header template: {engine:>12,.0f} H/s ({engine / baseline:.1f}x)")
+    print(f"binary header:   {binary:>12,.0f} H/s ({binary / baseline:.1f}x)")
+
+
+def build_chain(length, difficulty=1):
+    """Chain of `length` small blocks, mined at a low difficulty"""
+    blockchain = Blockchain(difficulty=difficulty)
+    for i in range(1, length):
+        previous = blockchain.get_latest_block()
+        block = blockchain._new_block(i, time.time(), {'benchmark': i}, previous.hash)
+        block.mine_block(difficulty)
+        blockchain._append(block)
+    return blockchain
+
+
+def bench_audit(length, workers):
+    """Compare serial full validation with the segmented process-pool audit"""
+    blockchain = build_chain(length)
+    
+    start = time.perf_counter()
+    blockchain.is_chain_valid(full=True)
+    serial = time.perf_counter() - start
+    print(f"{'is_chain_valid':<22} {serial:>8.3f}s")
+    
+    for worker_count in sorted({1, workers}):
+        report = blockchain.audit_chain(workers=worker_count)
+        print(f"{'audit_chain x' + str(worker_count):<22} {report['seconds']:>8.3f}s "
+              f"({serial / report['seconds']:.1f}x)")
+
+
+def bench_signature_audit(length, workers):
+    """Time verifying every record signature, on threads, processes and from the cache"""
+    blockchain = Blockchain(difficulty=1)
+    for i in range(1, length):
+        blockchain.add_block({'benchmark': i})
+    
+    for label, worker_count, use_processes in (('threads x1', 1, False),
+                                               (f'threads x{workers}', workers, False),
+                                               (f'processes x{workers}', workers, True)):
+        blockchain._verified_signatures.clear()
+        report = blockchain.verify_signatures(worker_count, use_processes)
+        print(f"{label:<16} {report['seconds']:>8.3f}s ({report['verified'] / report['seconds']:,.0f} sigs/s)")
+    report = blockchain.verify_signatures(workers)
+    print(f"{'cached':<16} {report['seconds']:>8.3f}s ({report['cached']} skipped)")
+
+
+def bench_sealing(length):
+    """Compare serialization and validation of sealed and unsealed blocks"""
+    blockchain = build_chain(length)
+    
+    def measure():
+        start = time.perf_counter()
+        json.dumps(blockchain.get_chain())
+        encode = time.perf_counter() - start
+        start = time.perf_counter()
+        blockchain.get_chain_json()
+        cached = time.perf_counter() - start
+        start = time.perf_counter()
+        blockchain.is_chain_valid(full=True)
+        return encode, cached, time.perf_counter() - start
+    
+    measure()
+    sealed = measure()
+    for block in blockchain.chain:
+        block.unseal()
+    unsealed = measure()
+    
+    print(f"{'':<10} {'json.dumps':>11} {'to_json':>9} {'validate':>9}")
+    for label, (encode, cached, validate) in (('unsealed', unsealed), ('sealed', sealed)):
+        print(f"{label:<10} {encode:>10.3f}s {cached:>8.3f}s {validate:>8.3f}s")
+
+
+def bench_memory(length):
+    """Compare memory per block of a list-backed and a compact-store Blockchain
+    
+    Blocks carry one record each as built for /api/transactions (an
+    envelope-encrypted payload, its hash and signature), and the chain's
+    hash indexes are counted too. "list (served)" has each block's cached
+    JSON and canonical bytes filled in, as they are once the API has served
+    and validated the chain; only the SEALED_CACHE_BLOCKS most recent blocks
+    keep them. Ratios are against the plain list; the compact store's
+    target is 5x.
+    """
+    source = Blockchain(difficulty=1)
+    records = [json.dumps(source._build_record({'benchmark': i, 'amount': i * 3}))
+               for i in range(length)]
+    stores = (('list', lambda: None, False), ('list (served)', lambda: None, True),
+              ('compact', CompactChainStore, False))
+    
+    baseline = None
+    for label, make_store, served in stores:
+        tracemalloc.start()
+        blockchain = Blockchain(difficulty=1, store=make_store(), security=source.security)
+        previous_hash = blockchain.get_latest_block().hash
+        for i in range(1, length):
+            block = Block(i, time.time(), [json.loads(records[i])], previous_hash,
+                          nonce=i * 7, target=1 << 240)
+            blockchain._append(block)
+            if served:
+                block.to_json()
+                block.calculate_hash()
+            previous_hash = block.hash
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        per_block = size / length
+        baseline = baseline or per_block
+        print(f"{label:<14} {per_block:>10,.0f} bytes/block {baseline / per_block:>6.1f}x")
+        del blockchain
+    
+    ratio = baseline / per_block
+    print(f"compact vs list: {ratio:.1f}x, 5x target {'met' if ratio >= 5 else 'not met'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--difficulty', type=int, nargs='+', default=[5, 6])
+    parser.add_argument('--workers', type=int, default=default_mining_workers())
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--hash-attempts', type=int, default=200000)
+    parser.add_argument('--sign-operations', type=int, default=500)
+    parser.add_argument('--audit-blocks', type=int, default=20000)
+    parser.add_argument('--signature-blocks', type=int, default=2000)
+    args = parser.parse_args()
+    
+    bench_imports(args.rounds)
+    print()
+    bench_encryption(args.rounds)
+    print()
+    bench_signing(args.sign_operations)
+    print()
+    bench_hashing(args.hash_attempts)
+    print()
+    bench_mining(args.difficulty, args.workers, args.rounds)
+    print()
+    bench_audit(args.audit_blocks, args.workers)
+    print()
+    bench_signature_audit(args.signature_blocks, args.workers)
+    print()
+    bench_sealing(args.audit_blocks)
+    print()
+    bench_memory(args.audit_blocks)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,296 @@
 import hashlib
+import heapq
+import itertools
 import json
 import time
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.backends import default_backend
-from Crypto.Cipher import AES
-from Crypto.Random import get_random_bytes
-from Crypto.Util.Padding import pad, unpad
 import base64
-import ecdsa
+import bisect
+import math
+import multiprocessing
+import os
+import queue
+import struct
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fractions import Fraction
+import threading
+
+
+# How many nonces a mining worker tries between checks of the stop flag
+MINING_CHECK_INTERVAL = 1000
+
+# Block header layouts: sorted-key JSON text, or fixed-width binary
+HEADER_JSON = 1
+HEADER_BINARY = 2
+HEADER_FORMATS = {'json': HEADER_JSON, 'binary': HEADER_BINARY}
+
+# version, index, timestamp, previous hash, payload digest, target; nonce follows as 8 bytes
+BINARY_HEADER = struct.Struct('>BQd32s32s32s')
+MAX_TARGET = (1 << 256) - 1
+
+# Block attributes whose change can invalidate an already validated chain
+HASHED_ATTRIBUTES = frozenset([
+    'index', 'timestamp', 'data', 'previous_hash', 'nonce', 'hash', 'version', 'target'
+])
+
+# Records signed over all their stored fields; older records were signed
+# over the plaintext payload only
+RECORD_SIGNATURE_SCHEME = 'record-sha256'
+
+# Largest factor a single retarget may raise or lower the target by
+MAX_RETARGET_FACTOR = 4
+
+# How many sealed blocks keep cached encodings at once; the caches of the
+# blocks filled longest ago are dropped, so memory does not grow per block
+SEALED_CACHE_BLOCKS = 4096
+
+# The genesis block is fixed, so every node starts from the same block and
+# its proof of work only has to be found once per (header version, target)
+GENESIS_TIMESTAMP = 1704067200.0
+GENESIS_DATA = "Genesis Block"
+GENESIS_NONCES = {
+    (HEADER_JSON, MAX_TARGET >> 16): 33961,
+    (HEADER_BINARY, MAX_TARGET >> 16): 141970
+}
+
+
+class EcdsaSigner:
+    """SECP256k1 signatures through the pure-Python ecdsa package
+    
+    Signatures are raw 64-byte r||s values over a SHA-256 digest, the same
+    format CryptographySigner produces, so either backend verifies the
+    other's. legacy=True verifies the SHA-1 signatures made before that.
+    """
+    
+    name = 'ecdsa'
+    
+    def __init__(self, pem=None):
+        import ecdsa
+        
+        if pem is None:
+            self._key = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1)
+        else:
+            self._key = ecdsa.SigningKey.from_pem(pem)
+        self._verifying_key = self._key.get_verifying_key()
+    
+    @classmethod
+    def from_public_pem(cls, pem):
+        """A verify-only signer for a public key PEM"""
+        import ecdsa
+        
+        signer = cls.__new__(cls)
+        signer._key = None
+        signer._verifying_key = ecdsa.VerifyingKey.from_pem(pem)
+        return signer
+    
+    def to_pem(self):
+        return self._key.to_pem().decode()
+    
+    def public_pem(self):
+        return self._verifying_key.to_pem().decode()
+    
+    def sign(self, data):
+        return self._key.sign(data, hashfunc=hashlib.sha256)
+    
+    def verify(self, data, signature, legacy=False):
+        try:
+            return self._verifying_key.verify(signature, data,
+                                              hashfunc=hashlib.sha1 if legacy else hashlib.sha256)
+        except Exception:
+            return False
+    
+    def verify_digest(self, digest, signature):
+        """Verify a signature against the SHA-256 digest of the signed data"""
+        try:
+            return self._verifying_key.verify_digest(signature, digest)
+        except Exception:
+            return False
+
+
+class CryptographySigner:
+    """SECP256k1 signatures through the OpenSSL-backed cryptography package
+    
+    Uses the same raw r||s over SHA-256 signature format as EcdsaSigner.
+    """
+    
+    name = 'cryptography'
+    
+    def __init__(self, pem=None):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+        
+        if pem is None:
+            self._key = ec.generate_private_key(ec.SECP256K1())
+        else:
+            self._key = serialization.load_pem_private_key(pem.encode(), password=None)
+        self._public_key = self._key.public_key()
+    
+    @classmethod
+    def from_public_pem(cls, pem):
+        """A verify-only signer for a public key PEM"""
+        from cryptography.hazmat.primitives import serialization
+        
+        signer = cls.__new__(cls)
+        signer._key = None
+        signer._public_key = serialization.load_pem_public_key(pem.encode())
+        return signer
+    
+    def to_pem(self):
+        from cryptography.hazmat.primitives import serialization
+        
+        return self._key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()
+        ).decode()
+    
+    def public_pem(self):
+        from cryptography.hazmat.primitives import serialization
+        
+        return self._public_key.public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+    
+    def sign(self, data):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+        
+        r, s = decode_dss_signature(self._key.sign(data, ec.ECDSA(hashes.SHA256())))
+        return r.to_bytes(32, 'big') + s.to_bytes(32, 'big')
+    
+    def verify(self, data, signature, legacy=False):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        
+        algorithm = hashes.SHA1() if legacy else hashes.SHA256()
+        return self._verify_der(signature, data, ec.ECDSA(algorithm))
+    
+    def verify_digest(self, digest, signature):
+        """Verify a signature against the SHA-256 digest of the signed data"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+        
+        return self._verify_der(signature, digest, ec.ECDSA(Prehashed(hashes.SHA256())))
+    
+    def _verify_der(self, signature, data, algorithm):
+        from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+        
+        if len(signature) != 64:
+            return False
+        der = encode_dss_signature(int.from_bytes(signature[:32], 'big'),
+                                   int.from_bytes(signature[32:], 'big'))
+        try:
+            self._public_key.verify(der, data, algorithm)
+            return True
+        except Exception:
+            return False
+
+
+# Signing backends by name; both share the key and signature formats
+SIGNERS = {'cryptography': CryptographySigner, 'ecdsa': EcdsaSigner}
 
 
 class SecurityModule:
-    """Advanced security module with encryption, signing, and hashing"""
+    """Advanced security module with encryption, signing, and hashing
     
-    def __init__(self):
-        # Generate RSA key pair for encryption/decryption
-        self.private_key = rsa.generate_private_key(
+    The crypto libraries are imported by the methods that use them, so
+    processes that only hash or validate blocks never load them.
+    """
+    
+    def __init__(self, private_key=None, signer=None):
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from cryptography.hazmat.backends import default_backend
+        
+        # Generate RSA key pair for encryption/decryption unless one is given
+        self.private_key = private_key or rsa.generate_private_key(
             public_exponent=65537,
             key_size=2048,
             backend=default_backend()
         )
         self.public_key = self.private_key.public_key()
         
-        # Generate ECDSA key pair for signing
-        self.signing_key = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1)
-        self.verifying_key = self.signing_key.get_verifying_key()
+        # ECDSA signer: an instance, a backend name from SIGNERS, or the default backend
+        if signer is None or isinstance(signer, str):
+            signer = SIGNERS[signer or 'cryptography']()
+        self.signer = signer
+    
+    def export_keys(self, password=None):
+        """Both private keys as PEM text, encrypted as PKCS#8 if a password is given"""
+        from cryptography.hazmat.primitives import serialization
+        
+        signing_key = self.signer.to_pem()
+        if not password:
+            encryption = serialization.NoEncryption()
+        else:
+            encryption = serialization.BestAvailableEncryption(password.encode())
+            # Re-serialize through cryptography so either signer backend's key is encrypted
+            signing_key = serialization.load_pem_private_key(
+                signing_key.encode(), password=None
+            ).private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                encryption
+            ).decode()
+        return {
+            'rsa_private_key': self.private_key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                encryption
+            ).decode(),
+            'ecdsa_signing_key': signing_key
+        }
+    
+    @classmethod
+    def from_keys(cls, keys, password=None, signer='cryptography'):
+        """Rebuild a module from export_keys output, signing with the named backend
+        
+        Signing keys saved unencrypted by earlier versions still load.
+        """
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.backends import default_backend
+        
+        private_key = serialization.load_pem_private_key(
+            keys['rsa_private_key'].encode(),
+            password=password.encode() if password else None,
+            backend=default_backend()
+        )
+        
+        signing_key = keys['ecdsa_signing_key']
+        if 'ENCRYPTED' in signing_key:
+            # Both signer backends take an unencrypted SEC1 PEM
+            signing_key = serialization.load_pem_private_key(
+                signing_key.encode(),
+                password=password.encode() if password else None,
+                backend=default_backend()
+            ).private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption()
+            ).decode()
+        return cls(private_key, SIGNERS[signer](signing_key))
+    
+    def save_keystore(self, path, password=None):
+        """Write the keys to a keystore file readable only by the owner"""
+        tmp_path = path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.export_keys(password), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def from_keystore(cls, path, password=None, signer='cryptography'):
+        """Load keys from a keystore file, generating and saving them on first use"""
+        if os.path.exists(path):
+            with open(path) as f:
+                return cls.from_keys(json.load(f), password, signer)
+        module = cls(signer=signer)
+        module.save_keystore(path, password)
+        return module
     
     def hash_data(self, data, algorithm='sha256'):
         """Hash data using specified algorithm"""
@@ -37,39 +302,85 @@ class SecurityModule:
             return hashlib.md5(data.encode()).hexdigest()
         return hashlib.sha256(data.encode()).hexdigest()
     
+    def rsa_encrypt_bytes(self, data):
+        """RSA-OAEP encrypt raw bytes (at most 190 for a 2048-bit key) to base64"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
+        encrypted = self.public_key.encrypt(
+            data,
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        )
+        return base64.b64encode(encrypted).decode()
+    
+    def rsa_decrypt_bytes(self, encrypted):
+        """Inverse of rsa_encrypt_bytes"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        
+        return self.private_key.decrypt(
+            base64.b64decode(encrypted),
+            padding.OAEP(
+                mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                algorithm=hashes.SHA256(),
+                label=None
+            )
+        )
+    
     def rsa_encrypt(self, message):
         """RSA encryption"""
         try:
-            encrypted = self.public_key.encrypt(
-                message.encode(),
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
-            )
-            return base64.b64encode(encrypted).decode()
+            return self.rsa_encrypt_bytes(message.encode())
         except Exception as e:
             return f"Encryption error: {str(e)}"
     
     def rsa_decrypt(self, encrypted_message):
         """RSA decryption"""
         try:
-            encrypted_bytes = base64.b64decode(encrypted_message)
-            decrypted = self.private_key.decrypt(
-                encrypted_bytes,
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
-            )
-            return decrypted.decode()
+            return self.rsa_decrypt_bytes(encrypted_message).decode()
+        except Exception as e:
+            return f"Decryption error: {str(e)}"
+    
+    def envelope_encrypt(self, message):
+        """Encrypt a message of any size with a fresh AES-256-GCM key wrapped by RSA-OAEP
+        
+        Only the 32-byte data key goes through RSA, so the RSA cost stays
+        the same whatever the message size.
+        """
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        
+        data_key = AESGCM.generate_key(bit_length=256)
+        nonce = os.urandom(12)
+        ciphertext = AESGCM(data_key).encrypt(nonce, message.encode(), None)
+        return {
+            'scheme': 'rsa-oaep-sha256+aes-256-gcm',
+            'wrapped_key': self.rsa_encrypt_bytes(data_key),
+            'nonce': base64.b64encode(nonce).decode(),
+            'ciphertext': base64.b64encode(ciphertext).decode()
+        }
+    
+    def envelope_decrypt(self, envelope):
+        """Decrypt envelope_encrypt output"""
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+        
+        try:
+            data_key = self.rsa_decrypt_bytes(envelope['wrapped_key'])
+            plaintext = AESGCM(data_key).decrypt(base64.b64decode(envelope['nonce']),
+                                                 base64.b64decode(envelope['ciphertext']), None)
+            return plaintext.decode()
         except Exception as e:
             return f"Decryption error: {str(e)}"
     
     def aes_encrypt(self, message, key=None):
         """AES encryption (symmetric)"""
+        from Crypto.Cipher import AES
+        from Crypto.Random import get_random_bytes
+        from Crypto.Util.Padding import pad
+        
         if key is None:
             key = get_random_bytes(32)  # 256-bit key
         
@@ -85,6 +396,9 @@ class SecurityModule:
     
     def aes_decrypt(self, ciphertext, key, iv):
         """AES decryption"""
+        from Crypto.Cipher import AES
+        from Crypto.Util.Padding import unpad
+        
         try:
             key_bytes = base64.b64decode(key)
             iv_bytes = base64.b64decode(iv)
@@ -98,137 +412,1531 @@ class SecurityModule:
     
     def sign_data(self, data):
         """Sign data using ECDSA"""
-        signature = self.signing_key.sign(data.encode())
+        signature = self.signer.sign(data.encode())
         return base64.b64encode(signature).decode()
     
     def verify_signature(self, data, signature):
-        """Verify ECDSA signature"""
+        """Verify ECDSA signature, accepting the SHA-1 signatures of older blocks too"""
         try:
             sig_bytes = base64.b64decode(signature)
-            self.verifying_key.verify(sig_bytes, data.encode())
-            return True
-        except:
+        except Exception:
             return False
+        return self.signer.verify(data.encode(), sig_bytes) or \
+            self.signer.verify(data.encode(), sig_bytes, legacy=True)
+
+
+class MiningCancelled(Exception):
+    """Raised when a proof-of-work search is stopped before finding a nonce"""
+
+
+class HeaderTemplate:
+    """Block header serialized once around the nonce, for fast PoW hashing
+    
+    Everything before the nonce is fed into a SHA-256 object once (the
+    midstate); each attempt copies that state and only hashes the encoded
+    nonce plus the fixed suffix, so the result is byte-for-byte the same as
+    Block.calculate_hash. JSON headers encode the nonce as decimal digits,
+    binary headers as a trailing 64-bit integer.
+    """
+    
+    def __init__(self, prefix, suffix, binary=False):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.binary = binary
+        self.midstate = hashlib.sha256(prefix)
+    
+    @classmethod
+    def from_block(cls, block):
+        """Build the template for a block's non-nonce header fields"""
+        if block.version == HEADER_BINARY:
+            return cls(block.header_prefix(), b'', binary=True)
+        
+        fields = block.header_fields()
+        keys = sorted(fields)
+        items = [json.dumps(key) + ': ' + json.dumps(fields[key], sort_keys=True) for key in keys]
+        split = bisect.bisect(keys, 'nonce')
+        
+        prefix = '{' + ''.join(item + ', ' for item in items[:split]) + '"nonce": '
+        suffix = ''.join(', ' + item for item in items[split:]) + '}'
+        return cls(prefix.encode(), suffix.encode())
+    
+    def digest(self, nonce):
+        """Raw SHA-256 digest of the header with the given nonce"""
+        h = self.midstate.copy()
+        h.update(nonce.to_bytes(8, 'big') if self.binary else b'%d' % nonce + self.suffix)
+        return h.digest()
+    
+    def search(self, target, start=0, step=1, stop=None, progress=None):
+        """Find the first nonce (start, start + step, ...) whose hash is <= target
+        
+        Returns (nonce, hexdigest), or None if the stop event was set first.
+        progress, if given, is called with the number of nonces tried so far.
+        """
+        bound = min(target, MAX_TARGET).to_bytes(32, 'big')
+        midstate = self.midstate
+        suffix = self.suffix
+        binary = self.binary
+        nonce = start
+        
+        while True:
+            for _ in range(MINING_CHECK_INTERVAL):
+                h = midstate.copy()
+                h.update(nonce.to_bytes(8, 'big') if binary else b'%d' % nonce + suffix)
+                digest = h.digest()
+                if digest <= bound:
+                    return nonce, digest.hex()
+                nonce += step
+            if progress is not None:
+                progress((nonce - start) // step)
+            if stop is not None and stop.is_set():
+                return None
+
+
+def difficulty_to_target(difficulty):
+    """Largest hash value accepted at `difficulty` leading hex zeros (may be fractional)"""
+    if difficulty <= 0:
+        return MAX_TARGET
+    if float(difficulty).is_integer():
+        return (1 << (256 - 4 * int(difficulty))) - 1
+    return int(2 ** (256 - 4 * difficulty)) - 1
+
+
+def target_to_difficulty(target):
+    """Equivalent number of leading hex zeros for an integer target"""
+    return round(64 - math.log2(target + 1) / 4, 4)
+
+
+def meets_target(block_hash, target):
+    """Check a hex block hash against a 256-bit integer target"""
+    return int(block_hash, 16) <= target
+
+
+def transaction_hash(record):
+    """SHA-256 of a record's canonical JSON, used as its Merkle leaf
+    
+    Leaves are prefixed with 0x00 and internal nodes with 0x01, so an
+    internal node can never pass for a leaf.
+    """
+    return hashlib.sha256(b'\x00' + json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+
+def _merkle_parent(left, right):
+    """Hash two child nodes (raw digests) into their parent"""
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def _merkle_levels(leaf_hashes):
+    """All tree levels from the leaves up to the root, as raw digests
+    
+    An odd node at the end of a level is promoted to the next level as it
+    is rather than paired with itself, so duplicating the last record
+    changes the root.
+    """
+    level = [bytes.fromhex(leaf) for leaf in leaf_hashes]
+    levels = [level]
+    while len(level) > 1:
+        parents = [_merkle_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+        levels.append(level)
+    return levels
+
+
+def merkle_root(leaf_hashes):
+    """Merkle root (hex) over leaf hashes; an odd node is promoted unhashed"""
+    if not leaf_hashes:
+        return hashlib.sha256(b'').hexdigest()
+    return _merkle_levels(leaf_hashes)[-1][0].hex()
+
+
+def merkle_proof(leaf_hashes, position):
+    """Sibling path proving the leaf at `position` is under the Merkle root
+    
+    Levels where the node was promoted without a sibling add no step.
+    """
+    proof = []
+    for level in _merkle_levels(leaf_hashes)[:-1]:
+        sibling = position ^ 1
+        if sibling < len(level):
+            proof.append({
+                'hash': level[sibling].hex(),
+                'position': 'left' if sibling < position else 'right'
+            })
+        position //= 2
+    return proof
+
+
+def verify_merkle_proof(tx_hash, proof, root):
+    """Check an inclusion proof from merkle_proof against a Merkle root"""
+    try:
+        node = bytes.fromhex(tx_hash)
+        for step in proof:
+            sibling = bytes.fromhex(step['hash'])
+            if step['position'] == 'left':
+                node = _merkle_parent(sibling, node)
+            else:
+                node = _merkle_parent(node, sibling)
+        return node.hex() == root
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+class SealedBlockError(Exception):
+    """Raised when something tries to modify a sealed block"""
+
+
+def _read_only(self, *args, **kwargs):
+    raise SealedBlockError("Sealed block data is read-only; call Block.unseal() first")
+
+
+class FrozenDict(dict):
+    """dict that refuses modification, used for the data of sealed blocks"""
+    
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+    
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+class FrozenList(list):
+    """list that refuses modification, used for the data of sealed blocks"""
+    
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+    
+    def __reduce__(self):
+        return FrozenList, (list(self),)
+
+
+def freeze(value):
+    """Recursively convert dicts and lists to their read-only counterparts"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Recursively convert frozen dicts and lists back to plain ones"""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
+
+
+_cached_blocks = OrderedDict()
+_cached_blocks_lock = threading.Lock()
+
+
+def _track_cached_block(block):
+    """Note that a block filled its sealed cache, evicting the oldest beyond the limit"""
+    with _cached_blocks_lock:
+        _cached_blocks[id(block)] = block
+        _cached_blocks.move_to_end(id(block))
+        while len(_cached_blocks) > SEALED_CACHE_BLOCKS:
+            _, evicted = _cached_blocks.popitem(last=False)
+            if evicted._sealed:
+                evicted._sealed.clear()
 
 
 class Block:
     """Individual block in the blockchain"""
     
-    def __init__(self, index, timestamp, data, previous_hash, nonce=0):
+    def __init__(self, index, timestamp, data, previous_hash, nonce=0,
+                 version=HEADER_JSON, target=None):
+        self._sealed = None
         self.index = index
         self.timestamp = timestamp
         self.data = data
         self.previous_hash = previous_hash
         self.nonce = nonce
+        self.version = version
+        if target is None and version == HEADER_BINARY:
+            target = MAX_TARGET
+        self.target = target
         self.hash = self.calculate_hash()
     
-    def calculate_hash(self):
-        """Calculate block hash using SHA-256"""
-        block_string = json.dumps({
+    def __setattr__(self, name, value):
+        if name in HASHED_ATTRIBUTES and self.__dict__.get('_sealed') is not None:
+            raise SealedBlockError(f"Block #{self.index} is sealed; call unseal() before changing {name}")
+        super().__setattr__(name, value)
+        # Let the owning chain know a hashed field changed after the fact
+        listener = self.__dict__.get('_on_change')
+        if listener is not None and name in HASHED_ATTRIBUTES:
+            listener(self, name)
+    
+    @property
+    def sealed(self):
+        return self._sealed is not None
+    
+    @classmethod
+    def restore(cls, index, timestamp, data, previous_hash, nonce, version, target, block_hash):
+        """Rebuild a stored block as sealed, trusting its stored hash until validated"""
+        block = cls.__new__(cls)
+        block._sealed = None
+        for name, value in (('index', index), ('timestamp', timestamp), ('data', data),
+                            ('previous_hash', previous_hash), ('nonce', nonce),
+                            ('version', version), ('target', target), ('hash', block_hash)):
+            object.__setattr__(block, name, value)
+        return block.seal()
+    
+    def seal(self):
+        """Freeze a mined block; its canonical bytes, leaves and JSON form are then cached"""
+        if self._sealed is not None:
+            return self
+        
+        super().__setattr__('data', freeze(self.data))
+        self._sealed = {}
+        return self
+    
+    def _sealed_value(self, key, compute):
+        """Value cached on a sealed block, computed on first use
+        
+        Only the SEALED_CACHE_BLOCKS blocks filled most recently keep theirs.
+        """
+        value = self._sealed.get(key)
+        if value is None:
+            value = self._sealed[key] = compute()
+            _track_cached_block(self)
+        return value
+    
+    def unseal(self):
+        """Make a sealed block mutable again, dropping its cached encodings"""
+        if self._sealed is None:
+            return self
+        
+        self._sealed = None
+        super().__setattr__('data', thaw(self.data))
+        listener = self.__dict__.get('_on_change')
+        if listener is not None:
+            listener(self, 'unseal')
+        return self
+    
+    @property
+    def transactions(self):
+        """Records carried by the block; single-payload blocks carry one"""
+        return self.data if isinstance(self.data, list) else [self.data]
+    
+    def transaction_hashes(self):
+        """Merkle leaf hashes of the block's records, in order"""
+        if self._sealed is not None:
+            return list(self._sealed_value('transaction_hashes', self._leaf_hashes))
+        return self._leaf_hashes()
+    
+    def _leaf_hashes(self):
+        return [transaction_hash(record) for record in self.transactions]
+    
+    def merkle_root(self):
+        """Merkle root of the block's records"""
+        return merkle_root(self.transaction_hashes())
+    
+    def header_fields(self):
+        """Hashed block fields, excluding the nonce
+        
+        Blocks holding a list of records commit to its Merkle root rather
+        than to the records themselves.
+        """
+        fields = {
             'index': self.index,
             'timestamp': self.timestamp,
-            'data': self.data,
-            'previous_hash': self.previous_hash,
-            'nonce': self.nonce
-        }, sort_keys=True)
-        return hashlib.sha256(block_string.encode()).hexdigest()
-    
-    def mine_block(self, difficulty):
-        """Proof of Work mining"""
-        target = '0' * difficulty
-        while self.hash[:difficulty] != target:
-            self.nonce += 1
-            self.hash = self.calculate_hash()
+            'previous_hash': self.previous_hash
+        }
+        if isinstance(self.data, list):
+            fields['merkle_root'] = self.merkle_root()
+        else:
+            fields['data'] = self.data
+        if self.target is not None:
+            fields['target'] = format(self.target, '064x')
+        return fields
+    
+    def payload_digest(self):
+        """SHA-256 digest of the canonical JSON payload (the Merkle root for record lists)"""
+        if isinstance(self.data, list):
+            return bytes.fromhex(self.merkle_root())
+        return hashlib.sha256(json.dumps(self.data, sort_keys=True).encode()).digest()
+    
+    def header_prefix(self):
+        """Binary header up to (not including) the trailing 64-bit nonce"""
+        return BINARY_HEADER.pack(
+            self.version,
+            self.index,
+            self.timestamp,
+            bytes.fromhex(self.previous_hash.zfill(64)),
+            self.payload_digest(),
+            self.target.to_bytes(32, 'big')
+        )
+    
+    def canonical_bytes(self):
+        """Exact bytes the block hash is computed over"""
+        if self._sealed is not None:
+            return self._sealed_value('canonical', self._encode_header)
+        return self._encode_header()
+    
+    def _encode_header(self):
+        if self.version == HEADER_BINARY:
+            return self.header_prefix() + self.nonce.to_bytes(8, 'big')
+        
+        fields = self.header_fields()
+        fields['nonce'] = self.nonce
+        block_string = json.dumps(fields, sort_keys=True)
+        return block_string.encode()
+    
+    def calculate_hash(self):
+        """Calculate block hash using SHA-256"""
+        return hashlib.sha256(self.canonical_bytes()).hexdigest()
+    
+    def mine_block(self, difficulty, workers=1, target=None, progress=None, stop=None):
+        """Proof of Work mining
+        
+        progress is called with the number of nonces tried so far; setting
+        the stop event aborts the search with MiningCancelled.
+        """
+        if target is None:
+            target = self.target if self.target is not None else difficulty_to_target(difficulty)
+        if workers > 1:
+            return self._mine_parallel(target, workers, progress, stop)
+        
+        template = HeaderTemplate.from_block(self)
+        result = template.search(target, start=self.nonce, stop=stop, progress=progress)
+        if result is None:
+            raise MiningCancelled(f"Mining of block #{self.index} was cancelled")
+        self.nonce, self.hash = result
+        return self.nonce
+    
+    def _mine_parallel(self, target, workers, progress=None, stop=None):
+        """Proof of Work mining with the nonce space split across processes"""
+        ctx = multiprocessing.get_context()
+        found = ctx.Event()
+        results = ctx.Queue()
+        attempts = ctx.Value('Q', 0)
+        template = HeaderTemplate.from_block(self)
+        header = (template.prefix, template.suffix, template.binary)
+        
+        processes = [
+            ctx.Process(
+                target=_mine_worker,
+                args=(header, target, self.nonce + offset, workers, found, results, attempts),
+                daemon=True
+            )
+            for offset in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        
+        try:
+            while True:
+                try:
+                    nonce, block_hash = results.get(timeout=0.2)
+                    break
+                except queue.Empty:
+                    if progress is not None:
+                        progress(attempts.value)
+                    if stop is not None and stop.is_set():
+                        raise MiningCancelled(f"Mining of block #{self.index} was cancelled")
+                    if not any(process.is_alive() for process in processes):
+                        raise RuntimeError("All mining workers exited without a result")
+        finally:
+            found.set()
+            for process in processes:
+                process.join()
+        
+        self.nonce = nonce
+        self.hash = block_hash
         return self.nonce
     
     def to_dict(self):
         """Convert block to dictionary"""
+        if self._sealed is not None:
+            return dict(self._sealed_value('dict', self._build_dict))
+        return self._build_dict()
+    
+    def _build_dict(self):
         return {
             'index': self.index,
             'timestamp': self.timestamp,
             'data': self.data,
             'previous_hash': self.previous_hash,
             'nonce': self.nonce,
-            'hash': self.hash
+            'hash': self.hash,
+            'version': self.version,
+            'target': format(self.target, '064x') if self.target is not None else None,
+            'difficulty': target_to_difficulty(self.target) if self.target is not None else None,
+            'merkle_root': self.merkle_root() if isinstance(self.data, list) else None
         }
+    
+    def to_json(self, cache=True):
+        """JSON text of to_dict(), cached once the block is sealed
+        
+        With cache=False an encoding that is not cached yet is built but not
+        kept, for one-off passes over the whole chain.
+        """
+        if self._sealed is not None and (cache or 'json' in self._sealed):
+            return self._sealed_value('json', lambda: json.dumps(self.to_dict(), sort_keys=True))
+        return json.dumps(self._build_dict(), sort_keys=True)
+
+
+def _mine_worker(header, target, start, step, found, results, attempts):
+    """Search every step-th nonce from start until a worker finds a valid hash"""
+    template = HeaderTemplate(*header)
+    
+    def report(tried):
+        with attempts.get_lock():
+            attempts.value += MINING_CHECK_INTERVAL
+    
+    result = template.search(target, start=start, step=step, stop=found, progress=report)
+    
+    if result is not None and not found.is_set():
+        found.set()
+        results.put(result)
+
+
+class MempoolFull(Exception):
+    """Raised when the mempool cannot take more transactions"""
+
+
+class Mempool:
+    """Pending transactions, deduplicated by content hash and ordered by priority"""
+    
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = {}
+        self._heap = []
+        self._sequence = itertools.count()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def __contains__(self, tx_hash):
+        return tx_hash in self._entries
+    
+    def __iter__(self):
+        """Pending entries, highest priority first"""
+        return iter(self.peek(len(self._entries)))
+    
+    def add(self, tx_hash, record, priority=0):
+        """Add a sealed record; returns False if the same content is already pending"""
+        if tx_hash in self._entries:
+            return False
+        if len(self._entries) >= self.max_size:
+            raise MempoolFull(f"Mempool is full ({self.max_size} transactions)")
+        
+        entry = {
+            'tx_hash': tx_hash,
+            'record': record,
+            'priority': priority,
+            'received_at': time.time()
+        }
+        self._entries[tx_hash] = entry
+        heapq.heappush(self._heap, (-priority, next(self._sequence), tx_hash))
+        return True
+    
+    def peek(self, count):
+        """Up to `count` entries, highest priority first, oldest first within a priority"""
+        return [self._entries[tx_hash] for _, _, tx_hash in heapq.nsmallest(count, self._heap)]
+    
+    def remove(self, tx_hashes):
+        """Drop entries that made it into a block"""
+        for tx_hash in tx_hashes:
+            self._entries.pop(tx_hash, None)
+        self._heap = [item for item in self._heap if item[2] in self._entries]
+        heapq.heapify(self._heap)
+    
+    def oldest_age(self):
+        """Seconds the oldest pending transaction has been waiting"""
+        if not self._entries:
+            return 0.0
+        return time.time() - min(entry['received_at'] for entry in self._entries.values())
+
+
+class ChainList(list):
+    """list of blocks that reports in-place changes through on_change(height)
+    
+    Replacing, deleting, inserting or reordering blocks calls on_change with
+    the lowest height affected; appends are left alone since new blocks get
+    validated anyway.
+    """
+    
+    def __init__(self, blocks=(), on_change=None):
+        super().__init__(blocks)
+        self.on_change = on_change
+    
+    def _lowest(self, key):
+        if isinstance(key, slice):
+            return min(range(*key.indices(len(self))), default=len(self))
+        return key + len(self) if key < 0 else key
+    
+    def _changed(self, height):
+        if self.on_change is not None:
+            self.on_change(max(0, height))
+    
+    def __setitem__(self, key, value):
+        height = self._lowest(key)
+        super().__setitem__(key, value)
+        self._changed(height)
+    
+    def __delitem__(self, key):
+        height = self._lowest(key)
+        super().__delitem__(key)
+        self._changed(height)
+    
+    def __imul__(self, count):
+        super().__imul__(count)
+        self._changed(0)
+        return self
+    
+    def insert(self, position, block):
+        height = min(self._lowest(position), len(self))
+        super().insert(position, block)
+        self._changed(height)
+    
+    def pop(self, position=-1):
+        height = self._lowest(position)
+        block = super().pop(position)
+        self._changed(height)
+        return block
+    
+    def remove(self, block):
+        height = self.index(block)
+        super().remove(block)
+        self._changed(height)
+    
+    def clear(self):
+        super().clear()
+        self._changed(0)
+    
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._changed(0)
+    
+    def reverse(self):
+        super().reverse()
+        self._changed(0)
+
+
+def _audit_segment(start, rows):
+    """Recompute hashes, proof of work and linkage for one audit segment
+    
+    Each row is (index, timestamp, data, previous_hash, nonce, version,
+    target, hash, expected_target). Returns (start, first invalid height or
+    None, seconds spent).
+    """
+    began = time.perf_counter()
+    previous_hash = None
+    
+    for offset, row in enumerate(rows):
+        index, timestamp, data, block_previous_hash, nonce, version, target, block_hash, \
+            expected_target = row
+        block = Block(index, timestamp, data, block_previous_hash, nonce, version, target)
+        if block.hash != block_hash or \
+                (previous_hash is not None and block_previous_hash != previous_hash) or \
+                (target is not None and target != expected_target) or \
+                not meets_target(block_hash, expected_target):
+            return start, start + offset, time.perf_counter() - began
+        previous_hash = block_hash
+    
+    return start, None, time.perf_counter() - began
+
+
+def record_signing_text(record):
+    """Canonical text a record's signature covers: every field but the signature"""
+    return json.dumps({key: value for key, value in record.items() if key != 'signature'},
+                      sort_keys=True)
+
+
+def record_digest(record):
+    """SHA-256 of the whole record, signature included, for caching verification results"""
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode()).digest()
+
+
+def _verify_signature_batch(signer_name, public_pem, items):
+    """Check (signed text, base64 signature) pairs against a public key
+    
+    Returns one bool per pair. Runs in pool threads or processes, so the
+    verifier is rebuilt from the public key PEM.
+    """
+    verifier = SIGNERS[signer_name].from_public_pem(public_pem)
+    results = []
+    for text, signature in items:
+        try:
+            digest = hashlib.sha256(text.encode()).digest()
+            results.append(verifier.verify_digest(digest, base64.b64decode(signature)))
+        except (TypeError, ValueError):
+            results.append(False)
+    return results
+
+
+def default_mining_workers():
+    """Number of mining processes to use when none is configured"""
+    return os.cpu_count() or 1
 
 
 class Blockchain:
     """Blockchain with security features"""
     
-    def __init__(self, difficulty=4):
-        self.chain = []
-        self.difficulty = difficulty
-        self.security = SecurityModule()
-        self.pending_transactions = []
+    def __init__(self, difficulty=4, mining_workers=1, header_format='json', target=None,
+                 retarget_interval=None, target_block_time=10.0,
+                 max_block_transactions=500, max_pending_age=30.0, max_pending=10000,
+                 checkpoints=None, store=None, journal=None, security=None, snapshot=None):
+        if header_format not in HEADER_FORMATS:
+            raise ValueError(f"Unknown header format: {header_format}")
+        if retarget_interval is not None and retarget_interval < 1:
+            raise ValueError("retarget_interval must be at least 1")
+        
+        # Any list-like store (append, len, indexing, iteration) can hold the chain;
+        # a plain list is wrapped so replacing blocks in it invalidates validation
+        if store is None or type(store) is list:
+            store = ChainList(store or (), self._chain_changed)
+        self.chain = store
+        self.header_format = header_format
+        self.target = target if target is not None else difficulty_to_target(difficulty)
+        self.difficulty = difficulty if target is None else target_to_difficulty(target)
+        self.retarget_interval = retarget_interval
+        self.target_block_time = target_block_time
+        self.mining_workers = mining_workers or default_mining_workers()
+        self.security = security or SecurityModule()
+        self.pending_transactions = Mempool(max_pending)
         self.mining_reward = 10
+        self.max_block_transactions = max_block_transactions
+        self.max_pending_age = max_pending_age
+        
+        # Optional write-ahead journal of records accepted but not yet mined;
+        # (height, entry_id) of mined blocks the store has not made durable yet,
+        # and for in-memory stores how many blocks the last snapshot saved
+        self.journal = journal
+        self.last_recovery = None
+        self._awaiting_sync = []
+        self._snapshot_length = 0
+        
+        # Called as on_validation_failed(height, source) when a new failure is found
+        self.on_validation_failed = None
+        self._reported_failure = None
         
-        # Create genesis block
-        self.create_genesis_block()
+        # Digests of records whose signatures verify_signatures already checked
+        self._verified_signatures = set()
+        
+        # Guards reading the tip and appending; proof of work runs outside it
+        self._lock = threading.RLock()
+        
+        # Mempool access, and one batch at a time so no transaction is mined twice
+        self._mempool_lock = threading.Lock()
+        self._batch_lock = threading.Lock()
+        
+        # Blocks below this height have been validated; the tip hash detects
+        # the chain list itself being truncated or replaced
+        self._validated_height = 1
+        self._validated_tip_hash = None
+        
+        # Block hash -> height, plus all hashes sorted for prefix search
+        self._rebuild_indexes()
+        
+        # Trusted height -> block hash pairs; validation starts after the latest one
+        self.checkpoints = {}
+        self._last_validation = {'checkpoint': None, 'blocks_checked': 0}
+        if isinstance(checkpoints, dict):
+            for height, block_hash in checkpoints.items():
+                self.add_checkpoint(height, block_hash)
+        else:
+            for checkpoint in checkpoints or []:
+                self.add_checkpoint(checkpoint['height'], checkpoint['hash'],
+                                    checkpoint.get('signature'))
+        
+        # Restore a snapshot, then create genesis block unless the store already holds a
+        # chain; a read-only store waits for its writer to create it
+        if snapshot is not None:
+            self.restore_snapshot(snapshot)
+        if len(self.chain) == 0 and not getattr(self.chain, 'read_only', False):
+            self.create_genesis_block()
     
     def create_genesis_block(self):
-        """Create the first block"""
-        genesis_block = Block(0, time.time(), "Genesis Block", "0")
-        genesis_block.mine_block(self.difficulty)
-        self.chain.append(genesis_block)
+        """Create the first block, reusing its known nonce when there is one"""
+        genesis_block = self._new_block(0, GENESIS_TIMESTAMP, GENESIS_DATA, "0")
+        target = self.expected_target(0)
+        nonce = GENESIS_NONCES.get((genesis_block.version, target))
+        if nonce is not None:
+            genesis_block.nonce = nonce
+            genesis_block.hash = genesis_block.calculate_hash()
+        if nonce is None or not meets_target(genesis_block.hash, target):
+            genesis_block.mine_block(self.difficulty, self.mining_workers)
+            GENESIS_NONCES[(genesis_block.version, target)] = genesis_block.nonce
+        self._append(genesis_block)
+    
+    def snapshot_state(self, include_blocks=True):
+        """Chain, indexes, checkpoints and validation watermark for a startup snapshot"""
+        with self._lock:
+            if self._indexes_stale:
+                self._rebuild_indexes()
+            if not include_blocks:
+                return {'blocks': [], 'checkpoints': dict(self.checkpoints)}
+            return {
+                'blocks': [(block.index, block.timestamp, block.data, block.previous_hash,
+                            block.nonce, block.version, block.target, block.hash)
+                           for block in self.chain],
+                'height_by_hash': dict(self._height_by_hash),
+                'sorted_hashes': list(self._sorted_hashes),
+                'checkpoints': dict(self.checkpoints),
+                'validated_height': self._validated_height,
+                'validated_tip_hash': self._validated_tip_hash
+            }
+    
+    def restore_snapshot(self, state):
+        """Load snapshot_state output into an empty chain
+        
+        A store that already holds blocks (a persistent one) is left as it
+        is; only the checkpoints are taken from the snapshot then.
+        """
+        with self._lock:
+            for height, block_hash in state['checkpoints'].items():
+                self.checkpoints.setdefault(height, block_hash)
+            if len(self.chain) != 0 or not state['blocks']:
+                return
+            
+            for fields in state['blocks']:
+                block = Block.restore(*fields)
+                block._on_change = self._block_changed
+                self.chain.append(block)
+            if state['height_by_hash'] and not self._store_serves_lookups():
+                self._height_by_hash = dict(state['height_by_hash'])
+                self._sorted_hashes = list(state['sorted_hashes'])
+                self._indexes_stale = False
+            else:
+                # Saved from (or restored into) a store that keeps its own index
+                self._rebuild_indexes()
+            self._validated_height = state['validated_height']
+            self._validated_tip_hash = state['validated_tip_hash']
+    
+    def _append(self, block):
+        """Seal a mined block, append it and watch it for later changes"""
+        block.seal()
+        block._on_change = self._block_changed
+        self.chain.append(block)
+        self._index_block(len(self.chain) - 1, block.hash)
+    
+    def _block_changed(self, block, name):
+        """Pull the validation watermark back below a block that was modified"""
+        if name in ('hash', 'unseal'):
+            self._indexes_stale = True
+        if name == 'index' or not isinstance(block.index, int):
+            self.invalidate_validation()
+        else:
+            self.invalidate_validation(block.index)
+    
+    def invalidate_validation(self, height=0):
+        """Forget validation results from `height` onwards"""
+        self._validated_height = max(1, min(self._validated_height, height))
+        if self._validated_height <= len(self.chain):
+            self._validated_tip_hash = self.chain[self._validated_height - 1].hash
+    
+    def _block_hash_at(self, height):
+        """Hash of the block at `height`, without materializing it if the store allows"""
+        block_hash = getattr(self.chain, 'block_hash', None)
+        if block_hash is not None:
+            return block_hash(height)
+        return self.chain[height].hash
+    
+    def _chain_changed(self, height):
+        """Pull the validation watermark back below a block replaced or removed in the list"""
+        self._indexes_stale = True
+        self.invalidate_validation(height)
+    
+    def _store_serves_lookups(self):
+        """Whether the store answers hash lookups and prefix search from its own index"""
+        return hasattr(self.chain, 'height_of') and hasattr(self.chain, 'search_prefix')
+    
+    def _index_block(self, height, block_hash):
+        """Add a block to the hash -> height map and the sorted hash list"""
+        if self._store_serves_lookups():
+            return
+        self._height_by_hash[block_hash] = height
+        bisect.insort(self._sorted_hashes, block_hash)
+    
+    def _rebuild_indexes(self):
+        """Rebuild the hash indexes from the chain, unless the store keeps its own"""
+        if self._store_serves_lookups():
+            self._height_by_hash, self._sorted_hashes = {}, []
+            self._indexes_stale = False
+            return
+        block_hashes = getattr(self.chain, 'block_hashes', None)
+        if block_hashes is not None:
+            hashes = block_hashes()
+        else:
+            hashes = [self._block_hash_at(height) for height in range(len(self.chain))]
+        self._height_by_hash = {block_hash: height for height, block_hash in enumerate(hashes)}
+        self._sorted_hashes = sorted(hashes)
+        self._indexes_stale = False
+    
+    def get_block(self, hash_or_height):
+        """Look up a block by height (int or decimal string) or by full hash"""
+        if isinstance(hash_or_height, int) or \
+                (isinstance(hash_or_height, str) and hash_or_height.isdigit() and
+                 len(hash_or_height) < 64):
+            height = int(hash_or_height)
+            return self.chain[height] if 0 <= height < len(self.chain) else None
+        
+        block_hash = hash_or_height.lower()
+        if self._store_serves_lookups():
+            height = self.chain.height_of(block_hash)
+            return self.chain[height] if height is not None else None
+        
+        if self._indexes_stale:
+            self._rebuild_indexes()
+        height = self._height_by_hash.get(block_hash)
+        if height is not None and (height >= len(self.chain) or
+                                   self._block_hash_at(height) != block_hash):
+            # The chain changed underneath the index
+            self._rebuild_indexes()
+            height = self._height_by_hash.get(block_hash)
+        return self.chain[height] if height is not None else None
+    
+    def search_blocks(self, prefix, limit=50):
+        """Blocks whose hash starts with `prefix`, in hash order (binary search on the sorted index)"""
+        prefix = prefix.lower()
+        if self._store_serves_lookups():
+            return [self.chain[height] for height in self.chain.search_prefix(prefix, limit)]
+        
+        if self._indexes_stale:
+            self._rebuild_indexes()
+        start = bisect.bisect_left(self._sorted_hashes, prefix)
+        
+        blocks = []
+        for block_hash in itertools.islice(self._sorted_hashes, start, start + limit):
+            if not block_hash.startswith(prefix):
+                break
+            height = self._height_by_hash.get(block_hash)
+            if height is not None and height < len(self.chain):
+                blocks.append(self.chain[height])
+        return blocks
+    
+    def find_blocks(self, query, limit=50):
+        """Explorer search: the block at a height given as digits, then hash-prefix matches"""
+        query = query.strip()
+        blocks = []
+        if query.isdigit() and int(query) < len(self.chain):
+            blocks.append(self.chain[int(query)])
+        for block in self.search_blocks(query, limit):
+            if len(blocks) >= limit:
+                break
+            if not blocks or block.hash != blocks[0].hash:
+                blocks.append(block)
+        return blocks
+    
+    def explore(self, query, newest_first=True, limit=50):
+        """find_blocks results as dicts sorted by height, for the dashboards' block explorers"""
+        blocks = [block.to_dict() for block in self.find_blocks(query, limit)]
+        blocks.sort(key=lambda block: block['index'], reverse=newest_first)
+        return blocks
+    
+    def _new_block(self, index, timestamp, data, previous_hash):
+        """Create an unmined block in this chain's header format and expected target"""
+        version = HEADER_FORMATS[self.header_format]
+        target = self.expected_target(index)
+        return Block(index, timestamp, data, previous_hash, version=version, target=target)
+    
+    def expected_target(self, height, blocks=None):
+        """Target the block at `height` has to be mined at
+        
+        Without a retarget interval every block uses the chain's target. With
+        one, every retarget_interval-th block scales the previous target by how
+        far the last interval's block times were from target_block_time,
+        clamped to MAX_RETARGET_FACTOR either way; the genesis block is always
+        held to the chain's target, which anchors the whole sequence. blocks
+        is a list of the chain's blocks to read from instead of the store.
+        """
+        if height == 0 or not self.retarget_interval:
+            return self.target
+        
+        if blocks is None:
+            blocks = self.chain
+        previous_block = blocks[height - 1]
+        previous_target = previous_block.target if previous_block.target is not None else self.target
+        if height % self.retarget_interval != 0:
+            return previous_target
+        
+        # The genesis block has a fixed timestamp, so intervals start after it
+        first_block = blocks[max(1, height - 1 - self.retarget_interval)]
+        actual = Fraction(previous_block.timestamp) - Fraction(first_block.timestamp)
+        expected = Fraction(self.target_block_time) * (previous_block.index - first_block.index)
+        if expected <= 0:
+            return previous_target
+        
+        ratio = min(max(actual / expected, Fraction(1, MAX_RETARGET_FACTOR)), MAX_RETARGET_FACTOR)
+        return max(1, min(MAX_TARGET, int(previous_target * ratio)))
+    
+    def current_difficulty(self):
+        """Difficulty the next block will be mined at"""
+        if not self.retarget_interval:
+            return self.difficulty
+        return target_to_difficulty(self.expected_target(len(self.chain)))
     
     def get_latest_block(self):
         """Get the most recent block"""
         return self.chain[-1]
     
-    def add_block(self, data):
-        """Add a new block to the chain"""
-        previous_block = self.get_latest_block()
-        new_index = previous_block.index + 1
-        new_timestamp = time.time()
+    def _build_record(self, data):
+        """Encrypt, hash and sign a payload for storage in a block
         
-        # Encrypt sensitive data
-        encrypted_data = self.security.rsa_encrypt(json.dumps(data))
-        
-        # Sign the data
-        signature = self.security.sign_data(json.dumps(data))
-        
-        block_data = {
-            'encrypted_data': encrypted_data,
-            'signature': signature,
-            'hash': self.security.hash_data(json.dumps(data))
+        The signature covers the stored envelope and hash, not just the
+        plaintext, so it can be checked without decrypting anything.
+        """
+        # Encrypt sensitive data under a per-record data key; RSA only wraps the key
+        record = {
+            'encrypted_data': self.security.envelope_encrypt(json.dumps(data)),
+            'hash': self.security.hash_data(json.dumps(data)),
+            'signature_scheme': RECORD_SIGNATURE_SCHEME
         }
+        record['signature'] = self.security.sign_data(record_signing_text(record))
+        return record
+    
+    def _verify_legacy_record(self, record):
+        """Check a record signed over its plaintext by decrypting and re-hashing it"""
+        plaintext = self.decrypt_record(record)
+        return self.security.hash_data(plaintext) == record['hash'] and \
+            self.security.verify_signature(plaintext, record['signature'])
+    
+    def decrypt_record(self, record):
+        """Plaintext JSON of a record's payload, for envelope and older RSA-only records"""
+        encrypted_data = record['encrypted_data']
+        if isinstance(encrypted_data, dict):
+            return self.security.envelope_decrypt(encrypted_data)
+        return self.security.rsa_decrypt(encrypted_data)
+    
+    def _mine_next(self, block_data, progress=None, stop=None):
+        """Mine block_data on top of the current tip and append it
+        
+        The lock is only held to read the tip and to append, so other
+        requests never wait on proof of work. If another block was appended
+        meanwhile, block_data is mined again on the new tip.
+        """
+        while True:
+            with self._lock:
+                previous_block = self.get_latest_block()
+                new_block = self._new_block(previous_block.index + 1, time.time(), block_data,
+                                            previous_block.hash)
+            
+            new_block.mine_block(self.difficulty, self.mining_workers,
+                                 progress=progress, stop=stop)
+            
+            with self._lock:
+                if len(self.chain) == new_block.index and \
+                        self.get_latest_block().hash == previous_block.hash:
+                    self._append(new_block)
+                    return new_block
+    
+    def accept_block(self, data):
+        """Build a payload's record and journal it ahead of mining
         
-        new_block = Block(new_index, new_timestamp, block_data, previous_block.hash)
-        new_block.mine_block(self.difficulty)
+        Returns (entry_id, record); entry_id is None without a journal.
+        """
+        record = self._build_record(data)
+        entry_id = self.journal.append(record) if self.journal is not None else None
+        return entry_id, record
+    
+    def mine_accepted(self, entry_id, record, progress=None, stop=None):
+        """Mine an accepted record onto the chain and close its journal entry
         
-        self.chain.append(new_block)
+        The entry stays open until the block is durably saved: committed by
+        a persistent store, or written to a snapshot for an in-memory one.
+        """
+        new_block = self._mine_next(record, progress, stop)
+        if entry_id is not None:
+            with self._lock:
+                self._awaiting_sync.append((new_block.index, entry_id))
+                self._close_synced_entries()
         return new_block
     
-    def is_chain_valid(self):
-        """Validate the blockchain"""
-        for i in range(1, len(self.chain)):
-            current_block = self.chain[i]
-            previous_block = self.chain[i - 1]
-            
-            # Check if hash is correct
-            if current_block.hash != current_block.calculate_hash():
+    def _close_synced_entries(self):
+        """Close journal entries whose blocks are durably saved"""
+        synced_length = getattr(self.chain, 'synced_length', self._snapshot_length)
+        while self._awaiting_sync and self._awaiting_sync[0][0] < synced_length:
+            self.discard_accepted(self._awaiting_sync.pop(0)[1])
+    
+    def snapshot_saved(self, length):
+        """Note that a snapshot holding the first `length` blocks is on disk"""
+        with self._lock:
+            self._snapshot_length = max(self._snapshot_length, length)
+            self._close_synced_entries()
+    
+    def discard_accepted(self, entry_id):
+        """Close a journal entry so it is not replayed"""
+        if entry_id is not None and self.journal is not None:
+            self.journal.complete(entry_id)
+    
+    def add_block(self, data, progress=None, stop=None):
+        """Add a new block to the chain
+        
+        progress and stop are passed through to Block.mine_block.
+        """
+        entry_id, record = self.accept_block(data)
+        return self.mine_accepted(entry_id, record, progress, stop)
+    
+    def recover_journal(self, time_budget=None):
+        """Re-mine blocks that were journaled but never made it onto the chain
+        
+        Entries whose record already sits at the chain tip (the process died
+        between appending and closing the entry) are just closed. Mining is
+        cancelled once time_budget seconds have passed; entries left over stay
+        pending in the journal for background mining. Returns a report.
+        """
+        started = time.time()
+        report = {'pending': 0, 'already_in_chain': 0, 'replayed': 0, 'deferred': 0,
+                  'corrupt_bytes': 0, 'seconds': 0.0}
+        if self.journal is None:
+            return report
+        
+        pending = self.journal.pending()
+        report['pending'] = len(pending)
+        report['corrupt_bytes'] = self.journal.corrupt_bytes
+        tail = self.chain[-len(pending):] if pending else []
+        
+        stop = threading.Event()
+        timer = None
+        if time_budget is not None:
+            timer = threading.Timer(time_budget, stop.set)
+            timer.daemon = True
+            timer.start()
+        try:
+            for entry_id, record in pending:
+                if any(block.data == record for block in tail):
+                    self.discard_accepted(entry_id)
+                    report['already_in_chain'] += 1
+                    continue
+                try:
+                    if stop.is_set():
+                        raise MiningCancelled()
+                    self.mine_accepted(entry_id, record, stop=stop)
+                    report['replayed'] += 1
+                except MiningCancelled:
+                    report['deferred'] += 1
+        finally:
+            if timer is not None:
+                timer.cancel()
+        
+        # Make the re-mined blocks durable so their entries are not replayed again
+        flush = getattr(self.chain, 'flush', None)
+        if flush is not None:
+            flush()
+        with self._lock:
+            self._close_synced_entries()
+        
+        report['seconds'] = time.time() - started
+        self.last_recovery = report
+        return report
+    
+    def submit_transaction(self, data, priority=0):
+        """Queue a payload in the mempool for the next batched block
+        
+        Returns (tx_hash, added); added is False when identical content is
+        already pending.
+        """
+        tx_hash = hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+        with self._mempool_lock:
+            if tx_hash in self.pending_transactions:
+                return tx_hash, False
+        
+        record = self._build_record(data)
+        with self._mempool_lock:
+            return tx_hash, self.pending_transactions.add(tx_hash, record, priority)
+    
+    def get_pending(self):
+        """Pending mempool entries, highest priority first, and the oldest one's age"""
+        with self._mempool_lock:
+            return list(self.pending_transactions), self.pending_transactions.oldest_age()
+    
+    def should_mine_pending(self):
+        """Whether the mempool has hit its size or age threshold"""
+        with self._mempool_lock:
+            pending = len(self.pending_transactions)
+            if pending == 0:
                 return False
+            if pending >= self.max_block_transactions:
+                return True
+            return self.max_pending_age is not None and \
+                self.pending_transactions.oldest_age() >= self.max_pending_age
+    
+    def mine_pending_transactions(self, miner_address='system', progress=None, stop=None):
+        """Pack the highest-priority pending transactions into one block
+        
+        The block's data is a list of records, closed by a mining reward
+        record for miner_address. Transactions leave the mempool only once
+        the block has been mined, so a cancelled batch loses nothing.
+        """
+        with self._batch_lock:
+            with self._mempool_lock:
+                entries = self.pending_transactions.peek(self.max_block_transactions)
+            if not entries:
+                return None
             
-            # Check if previous hash matches
-            if current_block.previous_hash != previous_block.hash:
-                return False
+            records = [entry['record'] for entry in entries]
+            records.append(self._build_record({
+                'type': 'mining_reward',
+                'miner': miner_address,
+                'amount': self.mining_reward,
+                'transactions': len(entries)
+            }))
             
-            # Check proof of work
-            if not current_block.hash.startswith('0' * self.difficulty):
+            new_block = self._mine_next(records, progress, stop)
+            with self._mempool_lock:
+                self.pending_transactions.remove(entry['tx_hash'] for entry in entries)
+        return new_block
+    
+    def get_transaction_proof(self, index, tx_hash):
+        """Merkle inclusion proof for a record in the block at `index`
+        
+        tx_hash may be the record's Merkle leaf hash or the payload hash
+        stored in the record. Returns None if the block or record is unknown.
+        Raises ValueError for single-payload blocks, whose header commits to
+        the payload itself rather than to a Merkle root.
+        """
+        if not 0 <= index < len(self.chain):
+            return None
+        
+        block = self.chain[index]
+        if not isinstance(block.data, list):
+            raise ValueError(f"Block #{index} holds a single payload and has no Merkle root")
+        leaf_hashes = block.transaction_hashes()
+        for position, (leaf, record) in enumerate(zip(leaf_hashes, block.transactions)):
+            if tx_hash == leaf or (isinstance(record, dict) and record.get('hash') == tx_hash):
+                root = merkle_root(leaf_hashes)
+                return {
+                    'block_index': block.index,
+                    'block_hash': block.hash,
+                    'tx_hash': leaf,
+                    'position': position,
+                    'merkle_root': root,
+                    'proof': merkle_proof(leaf_hashes, position)
+                }
+        return None
+    
+    def add_checkpoint(self, height, block_hash, signature=None):
+        """Trust the chain up to `height` if the block there has `block_hash`
+        
+        A signed checkpoint (see sign_checkpoint) is only accepted if the
+        signature verifies against this chain's signing key.
+        """
+        height = int(height)
+        if signature is not None and \
+                not self.security.verify_signature(f"{height}:{block_hash}", signature):
+            raise ValueError(f"Invalid signature for checkpoint at height {height}")
+        self.checkpoints[height] = block_hash
+        self.invalidate_validation()
+    
+    def sign_checkpoint(self, height):
+        """Signed checkpoint for the block at `height`, for use by other nodes"""
+        block_hash = self.chain[height].hash
+        return {
+            'height': height,
+            'hash': block_hash,
+            'signature': self.security.sign_data(f"{height}:{block_hash}")
+        }
+    
+    def _latest_checkpoint(self, length):
+        """Highest checkpoint within the first `length` blocks, or None"""
+        heights = [height for height in self.checkpoints if height < length]
+        return max(heights) if heights else None
+    
+    def is_chain_valid(self, full=False):
+        """Validate the blockchain
+        
+        Only blocks above the validated-height watermark are checked unless
+        full is set; modifying a block pulls the watermark back below it.
+        Without full, a from-scratch validation trusts everything up to the
+        latest checkpoint whose block hash matches.
+        """
+        length = len(self.chain)
+        start = self._validated_height
+        if full or start > length or (
+                start > 1 and self.chain[start - 1].hash != self._validated_tip_hash):
+            start = 1
+        
+        if start == 1:
+            checkpoint = None if full else self._latest_checkpoint(length)
+            self._last_validation = {'checkpoint': checkpoint, 'blocks_checked': 0}
+            if checkpoint is not None:
+                if self.chain[checkpoint].hash != self.checkpoints[checkpoint]:
+                    self._report_failure(checkpoint, 'checkpoint')
+                    return False
+                start = checkpoint + 1
+            elif not self._is_genesis_valid():
+                self._validated_height = 1
+                self._validated_tip_hash = self.chain[0].hash
+                self._report_failure(0, 'validation')
+                return False
+        
+        for i in range(start, length):
+            self._last_validation['blocks_checked'] += 1
+            if not self._is_block_valid(i):
+                self._validated_height = i
+                self._validated_tip_hash = self.chain[i - 1].hash
+                self._report_failure(i, 'validation')
                 return False
         
+        self._validated_height = length
+        self._validated_tip_hash = self.chain[length - 1].hash
+        self._reported_failure = None
+        return True
+    
+    def _report_failure(self, height, source):
+        """Tell on_validation_failed about a failure, once until the chain validates again"""
+        if self._reported_failure == (height, source):
+            return
+        self._reported_failure = (height, source)
+        if self.on_validation_failed is not None:
+            self.on_validation_failed(height, source)
+    
+    def verify_signatures(self, workers=None, use_processes=False, batch_size=256):
+        """Verify the ECDSA signature of every record in the chain on a worker pool
+        
+        Records signed over their stored fields are checked without
+        decrypting, on threads or processes. Older records, signed over the
+        plaintext, are decrypted and re-hashed on threads, since that needs
+        the private key. Results are cached by a digest of the whole record.
+        Records of blocks above genesis that carry no signature count as
+        failures.
+        """
+        began = time.perf_counter()
+        workers = workers or default_mining_workers()
+        with self._lock:
+            blocks = list(self.chain)
+        
+        pending = []
+        legacy = []
+        invalid = set()
+        cached = 0
+        for block in blocks[1:]:
+            for record in block.transactions:
+                if not isinstance(record, dict) or 'signature' not in record or 'hash' not in record:
+                    invalid.add(block.index)
+                    continue
+                digest = record_digest(record)
+                if digest in self._verified_signatures:
+                    cached += 1
+                elif record.get('signature_scheme') == RECORD_SIGNATURE_SCHEME:
+                    pending.append((block.index, digest, record))
+                else:
+                    legacy.append((block.index, digest, record))
+        
+        signer = self.security.signer
+        public_pem = signer.public_pem()
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        pool = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_verify_signature_batch, signer.name, public_pem,
+                                [(record_signing_text(record), record['signature'])
+                                 for _, _, record in batch])
+                for batch in batches
+            ]
+            results = [(item, verified) for batch, future in zip(batches, futures)
+                       for item, verified in zip(batch, future.result())]
+        if legacy:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results.extend(zip(legacy, executor.map(lambda item: self._verify_legacy_record(item[2]),
+                                                        legacy)))
+        
+        for (index, digest, _), verified in results:
+            if verified:
+                self._verified_signatures.add(digest)
+            else:
+                invalid.add(index)
+        
+        invalid_indexes = sorted(invalid)
+        if invalid_indexes:
+            self._report_failure(invalid_indexes[0], 'signature')
+        return {
+            'is_valid': not invalid_indexes,
+            'invalid_indexes': invalid_indexes,
+            'verified': len(pending) + len(legacy),
+            'cached': cached,
+            'workers': workers,
+            'executor': 'process' if use_processes else 'thread',
+            'seconds': time.perf_counter() - began
+        }
+    
+    def audit_chain(self, workers=None, segment_size=None, verify_signatures=False,
+                    signature_processes=False):
+        """Full validation split into segments checked by a process pool
+        
+        Workers recompute hashes, proof of work and in-segment linkage; the
+        links across segment boundaries are checked here. Returns the first
+        failing height (None when valid) and per-segment timings. With
+        verify_signatures, every record signature is verified too (see
+        verify_signatures) and the failing block indexes are reported.
+        """
+        began = time.perf_counter()
+        workers = workers or default_mining_workers()
+        with self._lock:
+            blocks = list(self.chain)
+        length = len(blocks)
+        if segment_size is None:
+            segment_size = max(1, -(-(length - 1) // (workers * 4)))
+        
+        rows = [
+            (block.index, block.timestamp, block.data, block.previous_hash, block.nonce,
+             block.version, block.target, block.hash, self.expected_target(i, blocks))
+            for i, block in enumerate(blocks)
+        ]
+        starts = range(1, length, segment_size)
+        segments = []
+        failures = [] if self._is_genesis_valid() else [0]
+        
+        # A segment's first block has to link to the last block of the one before
+        for start in starts:
+            if blocks[start].previous_hash != blocks[start - 1].hash:
+                failures.append(start)
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_audit_segment, start, rows[start:start + segment_size])
+                for start in starts
+            ]
+            for future in futures:
+                start, first_invalid, seconds = future.result()
+                segments.append({
+                    'start': start,
+                    'end': min(start + segment_size, length) - 1,
+                    'first_invalid_index': first_invalid,
+                    'seconds': seconds
+                })
+                if first_invalid is not None:
+                    failures.append(first_invalid)
+        
+        first_invalid = min(failures) if failures else None
+        if first_invalid is None and length == len(self.chain):
+            self._validated_height = length
+            self._validated_tip_hash = blocks[-1].hash
+        elif first_invalid is not None:
+            self._report_failure(first_invalid, 'audit')
+        
+        report = {
+            'is_valid': first_invalid is None,
+            'first_invalid_index': first_invalid,
+            'blocks_checked': max(0, length - 1),
+            'workers': workers,
+            'segment_size': segment_size,
+            'segments': segments
+        }
+        if verify_signatures:
+            report['signatures'] = self.verify_signatures(workers, signature_processes)
+            report['is_valid'] = report['is_valid'] and report['signatures']['is_valid']
+        report['seconds'] = time.perf_counter() - began
+        return report
+    
+    def _is_genesis_valid(self):
+        """Check the genesis block's hash and proof of work against the chain's target"""
+        genesis_block = self.chain[0]
+        if genesis_block.index != 0 or genesis_block.previous_hash != "0":
+            return False
+        if genesis_block.hash != genesis_block.calculate_hash():
+            return False
+        if genesis_block.target is not None and genesis_block.target != self.target:
+            return False
+        return meets_target(genesis_block.hash, self.target)
+    
+    def _is_block_valid(self, i):
+        """Check the block at height i against its predecessor"""
+        current_block = self.chain[i]
+        previous_block = self.chain[i - 1]
+        
+        # Check if hash is correct
+        if current_block.hash != current_block.calculate_hash():
+            return False
+        
+        # Check if previous hash matches
+        if current_block.previous_hash != previous_block.hash:
+            return False
+        
+        # Check proof of work against the target the block had to be mined at
+        expected_target = self.expected_target(i)
+        if current_block.target is not None and current_block.target != expected_target:
+            return False
+        if not meets_target(current_block.hash, expected_target):
+            return False
+        
         return True
     
     def get_chain(self):
         """Get the entire blockchain"""
         return [block.to_dict() for block in self.chain]
     
-    def get_chain_stats(self):
-        """Get blockchain statistics"""
+    def close(self):
+        """Flush and close the chain store, if it is backed by files, and the journal"""
+        close = getattr(self.chain, 'close', None)
+        if close is not None:
+            close()
+        if self.journal is not None:
+            with self._lock:
+                self._close_synced_entries()
+            self.journal.close()
+    
+    def get_chain_json(self):
+        """The entire blockchain as a JSON array, reusing each block's cached encoding"""
+        return '[' + ', '.join(block.to_json() for block in self.chain) + ']'
+    
+    def get_blocks(self, start, stop):
+        """Blocks with start <= height < stop, read from the store as one range"""
+        start, stop = max(0, start), min(stop, len(self.chain))
+        if stop <= start:
+            return []
+        block_range = getattr(self.chain, 'range', None)
+        if block_range is not None:
+            return block_range(start, stop - 1)
+        return self.chain[start:stop]
+    
+    def iter_blocks(self, start=0, stop=None, batch_size=1000):
+        """Yield blocks with start <= height < stop, reading batch_size at a time
+        
+        stop defaults to the chain length when iteration starts, so blocks
+        mined meanwhile are not included.
+        """
+        stop = len(self.chain) if stop is None else min(stop, len(self.chain))
+        for batch_start in range(max(0, start), stop, batch_size):
+            yield from self.get_blocks(batch_start, min(batch_start + batch_size, stop))
+    
+    def get_chain_page(self, limit=50, from_height=None, order='asc'):
+        """One page of at most `limit` blocks starting at from_height
+        
+        order is 'asc' (from_height defaults to genesis) or 'desc' (defaults
+        to the tip). Returns (blocks, next_cursor), where next_cursor is the
+        from_height of the following page or None after the last one.
+        """
+        length = len(self.chain)
+        if order == 'asc':
+            start = 0 if from_height is None else from_height
+            next_height = start + limit
+            return self.get_blocks(start, next_height), next_height if next_height < length else None
+        if order == 'desc':
+            top = length - 1 if from_height is None else min(from_height, length - 1)
+            next_height = top - limit
+            return self.get_blocks(next_height + 1, top + 1)[::-1], next_height if next_height >= 0 else None
+        raise ValueError(f"Unknown order: {order}")
+    
+    def get_chain_summary(self):
+        """Statistics that cost the same at any chain length; nothing is validated"""
         return {
             'total_blocks': len(self.chain),
-            'difficulty': self.difficulty,
-            'is_valid': self.is_chain_valid(),
+            'difficulty': self.current_difficulty(),
+            'target': format(self.expected_target(len(self.chain)), '064x'),
+            'header_format': self.header_format,
+            'pending_transactions': len(self.pending_transactions),
+            'validated_height': self._validated_height,
             'latest_block_hash': self.get_latest_block().hash
         }
+    
+    def get_chain_stats(self):
+        """Get blockchain statistics"""
+        stats = self.get_chain_summary()
+        stats.update({
+            'retarget_interval': self.retarget_interval,
+            'target_block_time': self.target_block_time,
+            'mining_workers': self.mining_workers,
+            'is_valid': self.is_chain_valid(),
+            'validated_height': self._validated_height,
+            'checkpoint': self._last_validation['checkpoint'],
+            'blocks_fully_checked': self._last_validation['blocks_checked'],
+            'journal_pending': len(self.journal) if self.journal is not None else None,
+            'journal_recovery': self.last_recovery
+        })
+        return stats
@@ -632,7 +632,7 @@ elif page == "⛓️ Blockchain":
         display_chain = chain[::-1] if sort_order == "Newest First" else chain
         
         if search:
-            display_chain = [b for b in display_chain if search.lower() in str(b['hash']).lower() or search in str(b['index'])]
+            display_chain = blockchain.explore(search, newest_first=(sort_order == "Newest First"))
         
         st.markdown(f"**📊 Showing {len(display_chain)} of {len(chain)} blocks**")
         st.divider()
@@ -0,0 +1,84 @@
+import itertools
+import json
+import queue
+import threading
+import time
+
+
+class Subscription:
+    """One subscriber's bounded queue of events
+    
+    When the queue is full the oldest event is dropped to make room, so a
+    slow client never blocks publishers or grows memory; `dropped` counts
+    the losses.
+    """
+    
+    def __init__(self, bus, max_queue, topics=None):
+        self.bus = bus
+        self.topics = set(topics) if topics else None
+        self.queue = queue.Queue(max_queue)
+        self.dropped = 0
+    
+    def wants(self, topic):
+        return self.topics is None or topic in self.topics
+    
+    def put(self, event):
+        """Queue an event, evicting the oldest one if the queue is full"""
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+    
+    def get(self, timeout=None):
+        """Next event, or None if none arrives within timeout seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """In-process publish/subscribe hub for server-sent events"""
+    
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+    
+    def subscribe(self, topics=None):
+        """Register a subscriber for some topics (all when None)"""
+        subscription = Subscription(self, self.max_queue, topics)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+    
+    def publish(self, topic, data):
+        """Hand an event to every interested subscriber without blocking"""
+        event = {'id': next(self._ids), 'event': topic, 'time': time.time(), 'data': data}
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.wants(topic)]
+        for subscription in subscribers:
+            subscription.put(event)
+        return event
+    
+    def __len__(self):
+        return len(self._subscribers)
+
+
+def format_sse(event):
+    """Render an event in the text/event-stream wire format"""
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
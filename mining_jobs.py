@@ -0,0 +1,234 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from blockchain import MiningCancelled
+
+
+class MiningQueueFull(Exception):
+    """Raised when no more mining jobs can be queued"""
+
+
+class MiningJob:
+    """A block waiting to be, or being, mined in the background"""
+    
+    def __init__(self, data, kind='block'):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.data = data
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.nonces_tried = 0
+        self.hashrate = 0.0
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self._last_sample = None
+    
+    @property
+    def done(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+    
+    def record_progress(self, nonces_tried):
+        """Update nonce count and current hashrate from a mining progress callback"""
+        now = time.time()
+        if self._last_sample is not None:
+            last_time, last_nonces = self._last_sample
+            if now > last_time:
+                self.hashrate = (nonces_tried - last_nonces) / (now - last_time)
+        self._last_sample = (now, nonces_tried)
+        self.nonces_tried = nonces_tried
+    
+    def elapsed(self):
+        """Seconds spent mining so far (or in total once finished)"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+    
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed': self.elapsed(),
+            'nonces_tried': self.nonces_tried,
+            'hashrate': self.hashrate,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class MiningJobManager:
+    """Runs add_block calls on a bounded worker pool and tracks their progress"""
+    
+    def __init__(self, blockchain, max_workers=1, max_pending=100, max_history=1000,
+                 on_complete=None, on_progress=None, progress_interval=0.5):
+        self.blockchain = blockchain
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self.on_complete = on_complete
+        
+        # Called with a job on every status change and at most every
+        # progress_interval seconds while it mines
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='mining')
+        self._scheduler = None
+        self._stopping = threading.Event()
+    
+    def submit(self, data):
+        """Queue a block for mining and return its job
+        
+        The payload is journaled (if the chain has a journal) before the
+        job is queued, so an acknowledged block survives a crash.
+        """
+        entry_id, record = self.blockchain.accept_block(data)
+        try:
+            return self.submit_accepted(entry_id, record)
+        except MiningQueueFull:
+            self.blockchain.discard_accepted(entry_id)
+            raise
+    
+    def submit_accepted(self, entry_id, record):
+        """Queue an already accepted (and journaled) record for mining"""
+        return self._enqueue(MiningJob({'entry_id': entry_id, 'record': record}))
+    
+    def submit_batch(self, miner_address='system'):
+        """Queue a batched block of pending transactions, reusing a batch job already waiting"""
+        with self._lock:
+            for job in self.jobs.values():
+                if job.kind == 'batch' and job.status == 'queued':
+                    return job
+        return self._enqueue(MiningJob({'miner_address': miner_address}, kind='batch'))
+    
+    def start_batch_scheduler(self, poll_interval=1.0, miner_address='system'):
+        """Queue batch jobs in the background whenever the mempool hits a threshold"""
+        def loop():
+            while not self._stopping.wait(poll_interval):
+                if self.blockchain.should_mine_pending() and not self._batch_active():
+                    try:
+                        self.submit_batch(miner_address)
+                    except MiningQueueFull:
+                        pass
+        
+        if self._scheduler is None:
+            self._scheduler = threading.Thread(target=loop, name='mining-batch-scheduler',
+                                               daemon=True)
+            self._scheduler.start()
+    
+    def _batch_active(self):
+        """Whether a batch job is queued or running"""
+        with self._lock:
+            return any(job.kind == 'batch' and not job.done for job in self.jobs.values())
+    
+    def _enqueue(self, job):
+        """Track a job and hand it to the worker pool"""
+        with self._lock:
+            pending = sum(1 for j in self.jobs.values() if not j.done)
+            if pending >= self.max_pending:
+                raise MiningQueueFull(f"{pending} mining jobs are already pending")
+            self.jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        return job
+    
+    def get(self, job_id):
+        """Look up a job by id"""
+        return self.jobs.get(job_id)
+    
+    def list_jobs(self):
+        """All tracked jobs, oldest first"""
+        with self._lock:
+            return list(self.jobs.values())
+    
+    def cancel(self, job_id):
+        """Request cancellation of a queued or running job"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if not job.done:
+            job.cancel_event.set()
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        return job
+    
+    def shutdown(self):
+        """Cancel outstanding jobs and stop the worker pool"""
+        self._stopping.set()
+        for job in list(self.jobs.values()):
+            job.cancel_event.set()
+        self._executor.shutdown(wait=True)
+    
+    def _notify(self, job):
+        """Pass a job to the on_progress callback"""
+        if self.on_progress is not None:
+            self.on_progress(job)
+    
+    def _progress_reporter(self, job):
+        """Mining progress callback that records progress and notifies at a throttled rate"""
+        last_report = [0.0]
+        
+        def report(nonces_tried):
+            job.record_progress(nonces_tried)
+            now = time.time()
+            if now - last_report[0] >= self.progress_interval:
+                last_report[0] = now
+                self._notify(job)
+        return report
+    
+    def _run(self, job):
+        """Mine one job on a pool thread"""
+        if job.cancel_event.is_set():
+            self._drop_cancelled(job)
+            return
+        job.status = 'running'
+        job.started_at = time.time()
+        self._notify(job)
+        progress = self._progress_reporter(job)
+        try:
+            if job.kind == 'batch':
+                block = self.blockchain.mine_pending_transactions(
+                    job.data['miner_address'], progress=progress, stop=job.cancel_event)
+            else:
+                block = self.blockchain.mine_accepted(job.data['entry_id'], job.data['record'],
+                                                      progress=progress, stop=job.cancel_event)
+            if block is None:
+                job.status = 'completed'
+                return
+            job.nonces_tried = max(job.nonces_tried, block.nonce)
+            job.result = {'block': block.to_dict()}
+            if self.on_complete is not None:
+                job.result.update(self.on_complete(block) or {})
+            job.status = 'completed'
+        except MiningCancelled:
+            job.status = 'cancelled'
+            self._drop_cancelled(job)
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+            job.hashrate = job.nonces_tried / job.elapsed() if job.elapsed() else 0.0
+            self._notify(job)
+    
+    def _drop_cancelled(self, job):
+        """Close the journal entry of a cancelled block; on shutdown it is kept for replay"""
+        if job.kind == 'block' and not self._stopping.is_set():
+            self.blockchain.discard_accepted(job.data['entry_id'])
+    
+    def _prune(self):
+        """Drop the oldest finished jobs beyond max_history"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[job_id]
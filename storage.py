@@ -0,0 +1,910 @@
+import base64
+import bisect
+import json
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import zlib
+from array import array
+from blockchain import Block, SecurityModule
+
+
+# Compact JSON used for payload bodies; re-encoded canonically when hashing
+PAYLOAD_SEPARATORS = (',', ':')
+PAYLOAD_COMPRESSION_LEVEL = 6
+
+# Type tags of the compact store's binary payload encoding
+(TAG_NONE, TAG_TRUE, TAG_FALSE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_INTERNED,
+ TAG_BASE64, TAG_HEX, TAG_LIST, TAG_DICT, TAG_SHAPED_DICT) = range(12)
+FLOAT = struct.Struct('>d')
+
+# Base64 and hex strings of at least MIN_PACKED_LENGTH characters are stored
+# as the raw bytes they encode; other strings shorter than MAX_INTERNED_LENGTH
+# (keys, scheme names) become ids into an intern table of limited size, as
+# do the key sequences ("shapes") of dicts
+MAX_INTERNED_LENGTH = 48
+MAX_INTERNED_STRINGS = 4096
+MAX_SHAPES = 4096
+MIN_PACKED_LENGTH = 16
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+# The payload arena is frozen into exact-size chunks of about this many
+# bytes, so it does not carry a growing bytearray's spare capacity
+ARENA_CHUNK_SIZE = 1 << 20
+
+
+def _hash_bytes(block_hash):
+    """Raw 32 bytes for a 64-character hex hash, or None if it is not one"""
+    if len(block_hash) != 64 or block_hash != block_hash.lower():
+        return None
+    try:
+        return bytes.fromhex(block_hash)
+    except ValueError:
+        return None
+
+
+def _write_varint(out, value):
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _base64_bytes(text):
+    """Raw bytes of a canonical base64 string, or None if it is not one"""
+    if len(text) % 4:
+        return None
+    try:
+        raw = base64.b64decode(text, validate=True)
+    except ValueError:
+        return None
+    return raw if base64.b64encode(raw).decode() == text else None
+
+
+class CompactChainStore:
+    """Columnar in-memory chain store for very long chains
+    
+    Header fields live in fixed-width arrays and hashes as raw 32-byte
+    strings, with a height column sorted by hash serving hash lookups and
+    prefix search. Payloads go into a chunked byte arena in a binary
+    encoding: base64 and hex strings (ciphertext, signatures, hashes) as
+    the bytes they encode, short strings and dict key sequences as ids into
+    intern tables.
+    Indexes that equal the height, nonces that fit 32 bits and previous
+    hashes that repeat the prior block's hash take no space of their own.
+    Blocks are materialized (sealed) only when indexed, so the store
+    behaves like the plain list Blockchain.chain normally is.
+    """
+    
+    def __init__(self, compress=False):
+        self.compress = compress
+        self.timestamps = array('d')
+        self.nonces = array('I')
+        self.versions = array('B')
+        self.target_ids = array('I')
+        self.hashes = bytearray()
+        self.hash_order = array('I')
+        self._unsorted_heights = array('I')
+        self._index_lock = threading.Lock()
+        self.payload_offsets = array('Q', [0])
+        self.payload_chunks = []
+        self.payloads = bytearray()
+        self._chunk_starts = [0]
+        
+        # Targets rarely change, so each block stores an id into this table;
+        # id 0 stands for "no recorded target"
+        self.targets = [None]
+        self._target_ids = {None: 0}
+        
+        # Short strings and dict key sequences seen in payloads, by id
+        self.strings = []
+        self._string_ids = {}
+        self.shapes = []
+        self._shape_ids = {}
+        
+        # Hashes that are not 64 lowercase hex characters (e.g. the genesis
+        # "0"), previous hashes that do not link to the prior block, and
+        # indexes and nonces that do not fit their columns, by height
+        self.odd_hashes = {}
+        self.unlinked_previous_hashes = {}
+        self.odd_indexes = {}
+        self.large_nonces = {}
+    
+    def __len__(self):
+        return len(self.timestamps)
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._materialize(i)
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self._materialize(i) for i in range(*key.indices(len(self)))]
+        
+        length = len(self)
+        if key < 0:
+            key += length
+        if not 0 <= key < length:
+            raise IndexError("chain index out of range")
+        return self._materialize(key)
+    
+    def append(self, block):
+        """Store a mined block"""
+        height = len(self)
+        
+        target_id = self._target_ids.get(block.target)
+        if target_id is None:
+            target_id = self._target_ids[block.target] = len(self.targets)
+            self.targets.append(block.target)
+        
+        raw_hash = _hash_bytes(block.hash)
+        if raw_hash is None:
+            self.odd_hashes[height] = block.hash
+            raw_hash = bytes(32)
+        if height == 0 or block.previous_hash != self.block_hash(height - 1):
+            self.unlinked_previous_hashes[height] = block.previous_hash
+        if block.index != height:
+            self.odd_indexes[height] = block.index
+        nonce = block.nonce
+        if not 0 <= nonce < 1 << 32:
+            self.large_nonces[height] = nonce
+            nonce = 0
+        
+        payload = bytearray()
+        self._pack(block.data, payload)
+        if self.compress:
+            payload = zlib.compress(payload, PAYLOAD_COMPRESSION_LEVEL)
+        self.payloads += payload
+        self.payload_offsets.append(self._chunk_starts[-1] + len(self.payloads))
+        if len(self.payloads) >= ARENA_CHUNK_SIZE:
+            self.payload_chunks.append(bytes(self.payloads))
+            self._chunk_starts.append(self.payload_offsets[-1])
+            self.payloads = bytearray()
+        self.timestamps.append(block.timestamp)
+        self.nonces.append(nonce)
+        self.versions.append(block.version)
+        self.target_ids.append(target_id)
+        self.hashes += raw_hash
+        if height not in self.odd_hashes:
+            with self._index_lock:
+                self._unsorted_heights.append(height)
+    
+    def _pack(self, value, out):
+        """Append the binary encoding of a JSON value to out"""
+        if value is None:
+            out.append(TAG_NONE)
+        elif value is True or value is False:
+            out.append(TAG_TRUE if value else TAG_FALSE)
+        elif isinstance(value, int):
+            out.append(TAG_INT)
+            _write_varint(out, value << 1 if value >= 0 else (-value << 1) - 1)
+        elif isinstance(value, float):
+            out.append(TAG_FLOAT)
+            out += FLOAT.pack(value)
+        elif isinstance(value, str):
+            self._pack_str(value, out)
+        elif isinstance(value, list):
+            out.append(TAG_LIST)
+            _write_varint(out, len(value))
+            for item in value:
+                self._pack(item, out)
+        elif isinstance(value, dict):
+            shape = tuple(value)
+            shape_id = self._shape_ids.get(shape)
+            if shape_id is None and len(self.shapes) < MAX_SHAPES:
+                shape_id = self._shape_ids[shape] = len(self.shapes)
+                self.shapes.append(shape)
+            if shape_id is not None:
+                out.append(TAG_SHAPED_DICT)
+                _write_varint(out, shape_id)
+                for item in value.values():
+                    self._pack(item, out)
+                return
+            out.append(TAG_DICT)
+            _write_varint(out, len(value))
+            for key, item in value.items():
+                self._pack_str(key, out)
+                self._pack(item, out)
+        else:
+            raise TypeError(f"Cannot store {type(value).__name__} in a block payload")
+    
+    def _pack_str(self, text, out):
+        raw = None
+        if len(text) >= MIN_PACKED_LENGTH:
+            if len(text) % 2 == 0 and HEX_DIGITS.issuperset(text):
+                out.append(TAG_HEX)
+                raw = bytes.fromhex(text)
+            else:
+                raw = _base64_bytes(text)
+                if raw is not None:
+                    out.append(TAG_BASE64)
+        
+        if raw is None and len(text) < MAX_INTERNED_LENGTH:
+            string_id = self._string_ids.get(text)
+            if string_id is None and len(self.strings) < MAX_INTERNED_STRINGS:
+                string_id = self._string_ids[text] = len(self.strings)
+                self.strings.append(text)
+            if string_id is not None:
+                out.append(TAG_INTERNED)
+                _write_varint(out, string_id)
+                return
+        
+        if raw is None:
+            out.append(TAG_STR)
+            raw = text.encode()
+        _write_varint(out, len(raw))
+        out += raw
+    
+    def _unpack(self, data, position):
+        """Decode one value at position; returns (value, next position)"""
+        tag = data[position]
+        position += 1
+        if tag == TAG_NONE:
+            return None, position
+        if tag == TAG_TRUE or tag == TAG_FALSE:
+            return tag == TAG_TRUE, position
+        if tag == TAG_INT:
+            value, position = _read_varint(data, position)
+            return (value >> 1) if not value & 1 else -((value + 1) >> 1), position
+        if tag == TAG_FLOAT:
+            return FLOAT.unpack_from(data, position)[0], position + FLOAT.size
+        if tag == TAG_INTERNED:
+            string_id, position = _read_varint(data, position)
+            return self.strings[string_id], position
+        if tag == TAG_LIST:
+            count, position = _read_varint(data, position)
+            items = []
+            for _ in range(count):
+                item, position = self._unpack(data, position)
+                items.append(item)
+            return items, position
+        if tag == TAG_SHAPED_DICT:
+            shape_id, position = _read_varint(data, position)
+            items = {}
+            for key in self.shapes[shape_id]:
+                items[key], position = self._unpack(data, position)
+            return items, position
+        if tag == TAG_DICT:
+            count, position = _read_varint(data, position)
+            items = {}
+            for _ in range(count):
+                key, position = self._unpack(data, position)
+                items[key], position = self._unpack(data, position)
+            return items, position
+        
+        length, position = _read_varint(data, position)
+        raw = bytes(data[position:position + length])
+        position += length
+        if tag == TAG_HEX:
+            return raw.hex(), position
+        if tag == TAG_BASE64:
+            return base64.b64encode(raw).decode(), position
+        return raw.decode(), position
+    
+    def _raw_hash(self, height):
+        return bytes(self.hashes[height * 32:(height + 1) * 32])
+    
+    def block_hash(self, height):
+        """Hex hash of the block at `height` without materializing it"""
+        if height in self.odd_hashes:
+            return self.odd_hashes[height]
+        return self.hashes[height * 32:(height + 1) * 32].hex()
+    
+    def _sort_hash_order(self):
+        """Merge heights appended since the last lookup into hash_order (lock held)
+        
+        A few are inserted one by one; a bulk load is sorted in one pass.
+        """
+        if len(self._unsorted_heights) < 64:
+            for height in self._unsorted_heights:
+                position = bisect.bisect_left(self.hash_order, self._raw_hash(height),
+                                              key=self._raw_hash)
+                self.hash_order.insert(position, height)
+        else:
+            self.hash_order.extend(self._unsorted_heights)
+            self.hash_order = array('I', sorted(self.hash_order, key=self._raw_hash))
+        self._unsorted_heights = array('I')
+    
+    def height_of(self, block_hash):
+        """Height of the block with `block_hash`, or None, by binary search of the hash column"""
+        raw_hash = _hash_bytes(block_hash)
+        if raw_hash is None:
+            return next((height for height, odd in self.odd_hashes.items() if odd == block_hash),
+                        None)
+        with self._index_lock:
+            self._sort_hash_order()
+            position = bisect.bisect_left(self.hash_order, raw_hash, key=self._raw_hash)
+            if position < len(self.hash_order) and \
+                    self._raw_hash(self.hash_order[position]) == raw_hash:
+                return self.hash_order[position]
+        return None
+    
+    def search_prefix(self, prefix, limit):
+        """Up to `limit` heights of blocks whose hash starts with `prefix`, in hash order"""
+        matches = [(odd, height) for height, odd in self.odd_hashes.items()
+                   if odd.startswith(prefix)]
+        if len(prefix) <= 64 and HEX_DIGITS.issuperset(prefix):
+            lowest = bytes.fromhex(prefix.ljust(64, '0'))
+            with self._index_lock:
+                self._sort_hash_order()
+                position = bisect.bisect_left(self.hash_order, lowest, key=self._raw_hash)
+                heights = self.hash_order[position:position + limit]
+            for height in heights:
+                block_hash = self.block_hash(height)
+                if not block_hash.startswith(prefix):
+                    break
+                matches.append((block_hash, height))
+        return [height for _, height in sorted(matches)[:limit]]
+    
+    def _materialize(self, height):
+        """Build the sealed Block stored at `height`"""
+        start, end = self.payload_offsets[height], self.payload_offsets[height + 1]
+        chunk = bisect.bisect_right(self._chunk_starts, start) - 1
+        arena = self.payload_chunks[chunk] if chunk < len(self.payload_chunks) else self.payloads
+        payload = arena[start - self._chunk_starts[chunk]:end - self._chunk_starts[chunk]]
+        if self.compress:
+            payload = zlib.decompress(payload)
+        previous_hash = self.unlinked_previous_hashes.get(height)
+        if previous_hash is None:
+            previous_hash = self.block_hash(height - 1)
+        
+        return Block.restore(
+            self.odd_indexes.get(height, height),
+            self.timestamps[height],
+            self._unpack(payload, 0)[0],
+            previous_hash,
+            self.large_nonces.get(height, self.nonces[height]),
+            self.versions[height],
+            self.targets[self.target_ids[height]],
+            self.block_hash(height)
+        )
+    
+    def memory_usage(self):
+        """Approximate bytes held by the store's columns and payload arena"""
+        columns = (self.timestamps, self.nonces, self.versions, self.target_ids,
+                   self.hash_order, self.payload_offsets)
+        return sum(column.itemsize * len(column) for column in columns) + \
+            len(self.hashes) + self.payload_offsets[-1]
+
+
+def block_record(block):
+    """Plain dict holding everything needed to restore a block"""
+    return {
+        'index': block.index,
+        'timestamp': block.timestamp,
+        'data': block.data,
+        'previous_hash': block.previous_hash,
+        'nonce': block.nonce,
+        'version': block.version,
+        'target': format(block.target, '064x') if block.target is not None else None,
+        'hash': block.hash
+    }
+
+
+def restore_block(record):
+    """Sealed Block from a dict produced by block_record"""
+    return Block.restore(
+        record['index'],
+        record['timestamp'],
+        record['data'],
+        record['previous_hash'],
+        record['nonce'],
+        record['version'],
+        int(record['target'], 16) if record['target'] is not None else None,
+        record['hash']
+    )
+
+
+class SegmentLogStore:
+    """Persistent append-only block log split into fixed-size segment files
+    
+    Each block is written once as a length- and CRC-framed JSON record to
+    the active segment, and a fixed-width entry (segment, offset, length,
+    raw hash) is appended to blocks.idx, so an append costs O(1) I/O
+    regardless of chain length. Files are fsynced every `sync_every`
+    appends (and on flush/close). Reads go through read-only memory maps of
+    the segments instead of file reads. Opening an existing directory
+    reloads the index, recovers complete records the index missed and drops
+    a torn tail left by a crash.
+    """
+    
+    RECORD_HEADER = struct.Struct('>II')
+    INDEX_ENTRY = struct.Struct('>IQI32s')
+    
+    def __init__(self, path, segment_size=64 * 1024 * 1024, sync_every=100):
+        self.path = path
+        self.segment_size = segment_size
+        self.sync_every = sync_every
+        self._lock = threading.RLock()
+        self._maps = {}
+        self._unsynced = 0
+        
+        os.makedirs(path, exist_ok=True)
+        self._entries = array('Q')
+        self._hashes = bytearray()
+        self._segment = self._load_index()
+        self._segment_file = open(self._segment_path(self._segment), 'ab')
+        self._index_file = open(self._index_path(), 'ab')
+    
+    def _segment_path(self, segment):
+        return os.path.join(self.path, f'segment-{segment:06d}.log')
+    
+    def _index_path(self):
+        return os.path.join(self.path, 'blocks.idx')
+    
+    def _load_index(self):
+        """Read blocks.idx, then reconcile it with the segments on disk"""
+        entry_size = self.INDEX_ENTRY.size
+        index_path = self._index_path()
+        raw = b''
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                raw = f.read()
+        
+        # A torn final entry is dropped; entries past the end of their segment too
+        valid = len(raw) // entry_size * entry_size
+        for offset in range(0, valid, entry_size):
+            segment, record_offset, length, raw_hash = self.INDEX_ENTRY.unpack_from(raw, offset)
+            path = self._segment_path(segment)
+            if not os.path.exists(path) or os.path.getsize(path) < record_offset + length:
+                valid = offset
+                break
+            self._entries.extend((segment, record_offset, length))
+            self._hashes += raw_hash
+        
+        if valid != len(raw):
+            with open(index_path, 'r+b') as f:
+                f.truncate(valid)
+        
+        return self._recover_unindexed()
+    
+    def _recover_unindexed(self):
+        """Index complete records written after the last index entry; cut off a torn one
+        
+        Returns the segment new records should be appended to.
+        """
+        if self._entries:
+            segment = self._entries[-3]
+            position = self._entries[-2] + self._entries[-1]
+        else:
+            segment, position = 0, 0
+        
+        recovered = []
+        while os.path.exists(self._segment_path(segment)):
+            path = self._segment_path(segment)
+            with open(path, 'rb') as f:
+                data = f.read()
+            while position + self.RECORD_HEADER.size <= len(data):
+                length, checksum = self.RECORD_HEADER.unpack_from(data, position)
+                end = position + self.RECORD_HEADER.size + length
+                body = data[position + self.RECORD_HEADER.size:end]
+                if end > len(data) or zlib.crc32(body) != checksum:
+                    break
+                record = json.loads(body)
+                recovered.append((segment, position, end - position, bytes.fromhex(record['hash'])))
+                position = end
+            
+            if position < len(data):
+                with open(path, 'r+b') as f:
+                    f.truncate(position)
+            if not os.path.exists(self._segment_path(segment + 1)):
+                break
+            segment, position = segment + 1, 0
+        
+        if recovered:
+            with open(self._index_path(), 'ab') as f:
+                for entry_segment, offset, length, raw_hash in recovered:
+                    f.write(self.INDEX_ENTRY.pack(entry_segment, offset, length, raw_hash))
+                    self._entries.extend((entry_segment, offset, length))
+                    self._hashes += raw_hash
+                f.flush()
+                os.fsync(f.fileno())
+        return segment
+    
+    def __len__(self):
+        return len(self._entries) // 3
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        
+        length = len(self)
+        if key < 0:
+            key += length
+        if not 0 <= key < length:
+            raise IndexError("chain index out of range")
+        return restore_block(json.loads(self._read_record(key)))
+    
+    def block_hash(self, height):
+        """Hex hash of the block at `height`, from the in-memory index"""
+        return self._hashes[height * 32:(height + 1) * 32].hex()
+    
+    def append(self, block):
+        """Write a block record and its index entry"""
+        raw_hash = bytes.fromhex(block.hash)
+        body = json.dumps(block_record(block), separators=PAYLOAD_SEPARATORS).encode()
+        record = self.RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+        
+        with self._lock:
+            offset = self._segment_file.tell()
+            if offset and offset + len(record) > self.segment_size:
+                self._roll_segment()
+                offset = 0
+            
+            self._segment_file.write(record)
+            self._segment_file.flush()
+            self._index_file.write(self.INDEX_ENTRY.pack(self._segment, offset, len(record), raw_hash))
+            self._index_file.flush()
+            self._entries.extend((self._segment, offset, len(record)))
+            self._hashes += raw_hash
+            
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self.flush()
+    
+    def _roll_segment(self):
+        """Close the full active segment and start the next one"""
+        self._sync_file(self._segment_file)
+        self._segment_file.close()
+        self._segment += 1
+        self._segment_file = open(self._segment_path(self._segment), 'ab')
+    
+    def _read_record(self, height):
+        """JSON body of the record at `height`, sliced out of the segment's memory map"""
+        segment, offset, length = self._entries[height * 3:height * 3 + 3]
+        with self._lock:
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped) < offset + length:
+                if mapped is not None:
+                    mapped.close()
+                with open(self._segment_path(segment), 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            return mapped[offset + self.RECORD_HEADER.size:offset + length]
+    
+    @staticmethod
+    def _sync_file(f):
+        f.flush()
+        os.fsync(f.fileno())
+    
+    @property
+    def synced_length(self):
+        """Number of blocks known to be on disk"""
+        return len(self) - self._unsynced
+    
+    def flush(self):
+        """fsync the active segment and the index"""
+        with self._lock:
+            self._sync_file(self._segment_file)
+            self._sync_file(self._index_file)
+            self._unsynced = 0
+    
+    def close(self):
+        """Flush and release files and memory maps"""
+        with self._lock:
+            self.flush()
+            self._segment_file.close()
+            self._index_file.close()
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+
+class SQLiteChainStore:
+    """Chain store backed by an SQLite database in WAL mode
+    
+    Blocks live in one table keyed by height with a unique index on hash.
+    Appends are grouped into one transaction per `commit_every` blocks (and
+    on flush/close), and WAL mode lets other processes read the committed
+    chain while this one mines. Those readers open the store with
+    read_only=True; their length is read from the database on every call,
+    so they see blocks as the writer commits them.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS blocks (
+            height INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL UNIQUE,
+            previous_hash TEXT NOT NULL,
+            timestamp REAL NOT NULL,
+            nonce INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            target TEXT,
+            data TEXT NOT NULL
+        )
+    """
+    COLUMNS = "height, timestamp, data, previous_hash, nonce, version, target, hash"
+    
+    def __init__(self, path, commit_every=100, read_only=False):
+        self.path = path
+        self.commit_every = commit_every
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._uncommitted = 0
+        
+        if read_only:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+            self._length = None
+            return
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(self.SCHEMA)
+        self._db.commit()
+        self._length = self._db.execute("SELECT COUNT(*) FROM blocks").fetchone()[0]
+    
+    @staticmethod
+    def _restore(row):
+        height, timestamp, data, previous_hash, nonce, version, target, block_hash = row
+        return Block.restore(height, timestamp, json.loads(data), previous_hash, nonce, version,
+                             int(target, 16) if target is not None else None, block_hash)
+    
+    def __len__(self):
+        if self._length is not None:
+            return self._length
+        with self._lock:
+            try:
+                return self._db.execute("SELECT COALESCE(MAX(height) + 1, 0) FROM blocks").fetchone()[0]
+            except sqlite3.OperationalError:
+                # The writer has not created the table yet
+                return 0
+    
+    def __iter__(self):
+        start = 0
+        while start < len(self):
+            page = self.range(start, start + 999)
+            yield from page
+            start += len(page) or len(self)
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self.range(start, stop - 1) if stop > start else []
+            return [self[i] for i in range(start, stop, step)]
+        
+        if key < 0:
+            key += len(self)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self.COLUMNS} FROM blocks WHERE height = ?", (key,)).fetchone()
+        if row is None:
+            raise IndexError("chain index out of range")
+        return self._restore(row)
+    
+    def range(self, start, end):
+        """Blocks with start <= height <= end, in height order"""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {self.COLUMNS} FROM blocks WHERE height BETWEEN ? AND ? ORDER BY height",
+                (start, end)).fetchall()
+        return [self._restore(row) for row in rows]
+    
+    def block_hash(self, height):
+        """Hash of the block at `height`"""
+        with self._lock:
+            row = self._db.execute("SELECT hash FROM blocks WHERE height = ?", (height,)).fetchone()
+        if row is None:
+            raise IndexError("chain index out of range")
+        return row[0]
+    
+    def block_hashes(self):
+        """All block hashes in height order"""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT hash FROM blocks ORDER BY height")]
+    
+    def height_of(self, block_hash):
+        """Height of the block with `block_hash`, via the hash index, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT height FROM blocks WHERE hash = ?", (block_hash,)).fetchone()
+        return row[0] if row else None
+    
+    def search_prefix(self, prefix, limit):
+        """Up to `limit` heights of blocks whose hash starts with `prefix`, in hash order"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT height FROM blocks WHERE hash >= ? AND hash < ? ORDER BY hash LIMIT ?",
+                (prefix, prefix + '\uffff', limit)).fetchall()
+        return [row[0] for row in rows]
+    
+    def append(self, block):
+        """Insert a block; the transaction commits every commit_every blocks"""
+        if self.read_only:
+            raise sqlite3.OperationalError(f"{self.path} is open read-only")
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO blocks (height, hash, previous_hash, timestamp, nonce, version, target, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._length, block.hash, block.previous_hash, block.timestamp, block.nonce,
+                 block.version, format(block.target, '064x') if block.target is not None else None,
+                 json.dumps(block.data, separators=PAYLOAD_SEPARATORS))
+            )
+            self._length += 1
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self.flush()
+    
+    @property
+    def synced_length(self):
+        """Number of blocks committed to the database"""
+        return len(self) - self._uncommitted
+    
+    def flush(self):
+        """Commit pending inserts"""
+        with self._lock:
+            self._db.commit()
+            self._uncommitted = 0
+    
+    def close(self):
+        """Commit and close the database"""
+        with self._lock:
+            self.flush()
+            self._db.close()
+
+
+class WriteAheadJournal:
+    """Checksummed journal of block records accepted but not yet mined
+    
+    Each accepted record is appended as a length- and CRC-framed JSON entry
+    and fsynced before the caller acknowledges the write; a matching "done"
+    entry follows once the block is on the chain (or the write is dropped).
+    Reopening the file replays it to find the entries still pending and
+    cuts off a torn tail. The file is truncated whenever nothing is pending,
+    so replay only ever scans the unfinished backlog.
+    """
+    
+    RECORD_HEADER = struct.Struct('>II')
+    
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._next_id = 1
+        self.corrupt_bytes = 0
+        
+        self._replay()
+        self._file = open(path, 'ab')
+    
+    def _replay(self):
+        """Rebuild the pending entries from the file, dropping a torn or corrupt tail"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        
+        position = 0
+        while position + self.RECORD_HEADER.size <= len(data):
+            length, checksum = self.RECORD_HEADER.unpack_from(data, position)
+            end = position + self.RECORD_HEADER.size + length
+            body = data[position + self.RECORD_HEADER.size:end]
+            if end > len(data) or zlib.crc32(body) != checksum:
+                break
+            entry = json.loads(body)
+            if entry['op'] == 'accept':
+                self._pending[entry['id']] = entry['record']
+            else:
+                self._pending.pop(entry['id'], None)
+            self._next_id = max(self._next_id, entry['id'] + 1)
+            position = end
+        
+        if position < len(data):
+            self.corrupt_bytes = len(data) - position
+            with open(self.path, 'r+b') as f:
+                f.truncate(position)
+    
+    def _write(self, entry):
+        body = json.dumps(entry, separators=PAYLOAD_SEPARATORS).encode()
+        self._file.write(self.RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def append(self, record):
+        """Durably journal an accepted record and return its entry id"""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._write({'op': 'accept', 'id': entry_id, 'record': record})
+            self._pending[entry_id] = record
+        return entry_id
+    
+    def complete(self, entry_id):
+        """Mark an entry as mined or dropped so it is not replayed"""
+        with self._lock:
+            if self._pending.pop(entry_id, None) is None:
+                return
+            if self._pending:
+                self._write({'op': 'done', 'id': entry_id})
+            else:
+                self._file.truncate(0)
+                self._file.flush()
+                if self.sync:
+                    os.fsync(self._file.fileno())
+    
+    def pending(self):
+        """(entry_id, record) pairs still to be mined, oldest first"""
+        with self._lock:
+            return sorted(self._pending.items())
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_HEADER = struct.Struct('>III')
+
+
+def save_snapshot(path, blockchain, model=None, include_blocks=True, password=None):
+    """Write keys, chain, hash indexes and an optional trained model for fast startup
+    
+    include_blocks can be turned off for persistent chain stores, which
+    reload their blocks on their own. The file is replaced atomically, and
+    journal entries of the saved blocks are closed afterwards.
+    """
+    state = {
+        'keys': blockchain.security.export_keys(password),
+        'chain': blockchain.snapshot_state(include_blocks),
+        'model': model
+    }
+    body = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    tmp_path = path + '.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_FORMAT, len(body), zlib.crc32(body)))
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    
+    # Journal entries of in-memory chains can close once their blocks are saved here
+    if include_blocks:
+        blockchain.snapshot_saved(len(state['chain']['blocks']))
+
+
+def load_snapshot(path, password=None, signer='cryptography'):
+    """Read a snapshot written by save_snapshot
+    
+    Returns a dict with 'security' (a SecurityModule), 'chain' (for
+    Blockchain(snapshot=...)) and 'model', or None if the file is missing,
+    from another format version or damaged. Snapshots are pickles, so only
+    load files this node wrote itself.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+    
+    version, length, checksum = SNAPSHOT_HEADER.unpack_from(data)
+    body = data[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length]
+    if version != SNAPSHOT_FORMAT or len(body) != length or zlib.crc32(body) != checksum:
+        return None
+    
+    state = pickle.loads(body)
+    state['security'] = SecurityModule.from_keys(state.pop('keys'), password, signer)
+    return state